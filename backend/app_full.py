@@ -7,10 +7,14 @@ import sqlite3
 import os
 import uuid
 import random
-import math
 from datetime import datetime
 from contextlib import contextmanager
 
+from geo_distance import (
+    as_coordinate_array, bounding_box, points_within_radius, intersecting_search_areas
+)
+from intersection_analysis import intersecting_pairs
+
 # Create Flask app
 app = Flask(__name__)
 CORS(app, origins="*")
@@ -100,50 +104,14 @@ def init_database():
                 FOREIGN KEY (listing_id) REFERENCES listings (id),
                 UNIQUE(user_id, listing_id)
             );
+
+            -- Индексы для префильтра по координатам
+            CREATE INDEX IF NOT EXISTS idx_listings_lat_lon ON listings (lat, lon);
+            CREATE INDEX IF NOT EXISTS idx_users_search_lat_lon ON users (search_lat, search_lon);
         ''')
         conn.commit()
     print("✅ База данных инициализирована")
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Вычисление расстояния между двумя точками в метрах (формула Haversine)"""
-    if not all([lat1, lon1, lat2, lon2]):
-        return float('inf')
-    
-    # Радиус Земли в метрах
-    R = 6371000  
-    
-    # Преобразование в радианы
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Разности координат
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Формула Haversine
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance
-
-def do_search_areas_intersect(user1, user2):
-    """Проверка пересечения зон поиска двух пользователей"""
-    if not all([user1['search_lat'], user1['search_lon'], user1['search_radius'],
-                user2['search_lat'], user2['search_lon'], user2['search_radius']]):
-        return False
-    
-    # Расстояние между центрами зон поиска
-    distance = calculate_distance(
-        user1['search_lat'], user1['search_lon'],
-        user2['search_lat'], user2['search_lon']
-    )
-    
-    # Зоны пересекаются, если расстояние меньше суммы радиусов
-    return distance <= (user1['search_radius'] + user2['search_radius'])
-
 # Инициализация БД при старте
 init_database()
 
@@ -220,29 +188,33 @@ def get_potential_matches(user_id):
         if not current_user:
             return jsonify({"error": "Пользователь не найден"}), 404
         
-        # Получаем всех других пользователей
+        if not all([current_user['search_lat'], current_user['search_lon'], current_user['search_radius']]):
+            return jsonify({
+                "current_user_id": user_id,
+                "potential_matches": [],
+                "count": 0
+            })
+        
+        # Получаем всех других пользователей, кроме уже лайкнутых
         other_users = conn.execute('''
             SELECT * FROM users 
             WHERE id != ? AND is_active = 1
-        ''', (user_id,)).fetchall()
+              AND id NOT IN (SELECT liked_id FROM user_likes WHERE liker_id = ?)
+        ''', (user_id, user_id)).fetchall()
         
-        # Получаем уже лайкнутых пользователей
-        liked_users = conn.execute('''
-            SELECT liked_id FROM user_likes WHERE liker_id = ?
-        ''', (user_id,)).fetchall()
-        liked_user_ids = {row['liked_id'] for row in liked_users}
+        # Проверяем пересечение зон поиска сразу для всех кандидатов
+        indices, _ = intersecting_search_areas(
+            current_user['search_lat'], current_user['search_lon'], current_user['search_radius'],
+            as_coordinate_array([user['search_lat'] for user in other_users]),
+            as_coordinate_array([user['search_lon'] for user in other_users]),
+            as_coordinate_array([user['search_radius'] for user in other_users])
+        )
         
         potential_matches = []
-        for user in other_users:
-            # Пропускаем уже лайкнутых
-            if user['id'] in liked_user_ids:
-                continue
-            
-            # Проверяем пересечение зон поиска
-            if do_search_areas_intersect(dict(current_user), dict(user)):
-                user_dict = dict(user)
-                user_dict['intersection_reason'] = 'search_areas_overlap'
-                potential_matches.append(user_dict)
+        for index in indices:
+            user_dict = dict(other_users[index])
+            user_dict['intersection_reason'] = 'search_areas_overlap'
+            potential_matches.append(user_dict)
         
         return jsonify({
             "current_user_id": user_id,
@@ -250,6 +222,58 @@ def get_potential_matches(user_id):
             "count": len(potential_matches)
         })
 
+# ====================== ОБЪЯВЛЕНИЯ ======================
+
+@app.route('/api/listings/search')
+def search_listings():
+    """Поиск объявлений в радиусе от точки с фильтром по цене"""
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', 1000, type=int)
+    price_min = request.args.get('price_min', type=int)
+    price_max = request.args.get('price_max', type=int)
+    limit = request.args.get('limit', 50, type=int)
+    
+    if lat is None or lon is None:
+        return jsonify({"error": "lat и lon обязательны"}), 400
+    
+    # Префильтр по описанному квадрату использует индексы по lat/lon
+    min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+    query = '''
+        SELECT * FROM listings
+        WHERE is_active = 1
+          AND lat BETWEEN ? AND ?
+          AND lon BETWEEN ? AND ?
+    '''
+    params = [min_lat, max_lat, min_lon, max_lon]
+    if price_min is not None:
+        query += ' AND price >= ?'
+        params.append(price_min)
+    if price_max is not None:
+        query += ' AND price <= ?'
+        params.append(price_max)
+    
+    with get_db() as conn:
+        listings = conn.execute(query, params).fetchall()
+    
+    indices, distances = points_within_radius(
+        lat, lon, radius,
+        as_coordinate_array([listing['lat'] for listing in listings]),
+        as_coordinate_array([listing['lon'] for listing in listings])
+    )
+    order = distances.argsort(kind='stable')[:limit]
+    
+    results = []
+    for position in order:
+        listing_dict = dict(listings[indices[position]])
+        listing_dict['distance'] = round(float(distances[position]) / 1000, 3)  # км
+        results.append(listing_dict)
+    
+    return jsonify({
+        "listings": results,
+        "count": len(results)
+    })
+
 # ====================== ЛАЙКИ ======================
 
 @app.route('/api/users/<user_id>/like', methods=['POST'])
@@ -475,7 +499,7 @@ def create_test_interactions():
 
 @app.route('/api/test/analyze-intersections')
 def analyze_intersections():
-    """Анализ пересечений зон поиска пользователей"""
+    """Анализ пересечений зон поиска пользователей (сетка вместо перебора всех пар)"""
     
     with get_db() as conn:
         users = conn.execute('SELECT * FROM users WHERE is_active = 1').fetchall()
@@ -484,42 +508,35 @@ def analyze_intersections():
     if len(users) < 2:
         return jsonify({"error": "Недостаточно пользователей для анализа"}), 400
     
-    intersections = []
+    def summary(user):
+        return {
+            "id": user['id'],
+            "name": f"{user['first_name']} {user['last_name']}",
+            "metro_station": user['metro_station'],
+            "search_radius": user['search_radius']
+        }
     
-    for i, user1 in enumerate(users):
-        for j, user2 in enumerate(users[i+1:], i+1):
-            distance = calculate_distance(
-                user1['search_lat'], user1['search_lon'],
-                user2['search_lat'], user2['search_lon']
-            )
-            
-            intersects = do_search_areas_intersect(user1, user2)
-            
-            intersections.append({
-                "user1": {
-                    "id": user1['id'],
-                    "name": f"{user1['first_name']} {user1['last_name']}",
-                    "metro_station": user1['metro_station'],
-                    "search_radius": user1['search_radius']
-                },
-                "user2": {
-                    "id": user2['id'], 
-                    "name": f"{user2['first_name']} {user2['last_name']}",
-                    "metro_station": user2['metro_station'],
-                    "search_radius": user2['search_radius']
-                },
+    pairs = []
+    for i, j, distances in intersecting_pairs(
+        [user['search_lat'] for user in users],
+        [user['search_lon'] for user in users],
+        [user['search_radius'] for user in users],
+        workers=1
+    ):
+        for a, b, distance in zip(i.tolist(), j.tolist(), distances.tolist()):
+            user1, user2 = users[a], users[b]
+            pairs.append({
+                "user1": summary(user1),
+                "user2": summary(user2),
                 "distance_between_centers": round(distance, 2),
-                "search_areas_intersect": intersects,
+                "search_areas_intersect": True,
                 "combined_radius": user1['search_radius'] + user2['search_radius']
             })
     
-    # Фильтруем только пересечения
-    intersecting_pairs = [item for item in intersections if item['search_areas_intersect']]
-    
     return jsonify({
-        "total_pairs_analyzed": len(intersections),
-        "intersecting_pairs": len(intersecting_pairs),
-        "intersection_details": intersecting_pairs
+        "total_pairs_analyzed": len(users) * (len(users) - 1) // 2,
+        "intersecting_pairs": len(pairs),
+        "intersection_details": pairs
     })
 
 if __name__ == "__main__":
@@ -8,8 +8,9 @@ import time
 from urllib.parse import parse_qs
 from typing import Dict, Optional
 from models import User
-from services import UserService
+from services import UserService, UserIdentity
 from database import get_database
+from auth_new import is_session_token, get_session_identity, get_session_user, session_user_identity
 import os
 
 security = HTTPBearer()
@@ -113,8 +114,11 @@ async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_database)
 ) -> User:
-    """Get current user from token"""
+    """Get current user from a session token (see /api/auth/session) or initData"""
     try:
+        if is_session_token(credentials.credentials):
+            return await get_session_user(credentials, db)
+        
         # Verify auth data
         user_data = await verify_telegram_auth(credentials)
         telegram_id = user_data.get('id')
@@ -125,9 +129,9 @@ async def get_current_user(
                 detail="No user ID in token"
             )
         
-        # Get user from database
+        # Get user from database (once per request, see UserService.get_current_user)
         user_service = UserService(db)
-        user = await user_service.get_user_by_telegram_id(int(telegram_id))
+        user = await user_service.get_current_user(int(telegram_id))
         
         if not user:
             raise HTTPException(
@@ -143,4 +147,45 @@ async def get_current_user(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials"
-        )
\ No newline at end of file
+        )
+
+async def get_current_identity(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_database)
+) -> UserIdentity:
+    """Get current user's identity (id, telegram_id, is_active) without loading the row
+
+    A session token carries the identity itself (no query at all); with
+    initData it is served from the cross-request identity cache, so endpoints
+    that only need the user id make no query for authentication on a cache hit.
+    """
+    try:
+        if is_session_token(credentials.credentials):
+            return session_user_identity(await get_session_identity(credentials))
+        
+        user_data = await verify_telegram_auth(credentials)
+        telegram_id = user_data.get('id')
+        
+        if not telegram_id:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="No user ID in token"
+            )
+        
+        identity = await UserService(db).resolve_identity(int(telegram_id))
+        
+        if not identity:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        return identity
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
@@ -5,15 +5,21 @@
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, text
+import base64
 import hmac
 import hashlib
 import json
+import re
 import time
+import uuid
+from functools import lru_cache
 from urllib.parse import parse_qsl, unquote
-from typing import Dict, Optional
+from typing import Dict, NamedTuple, Optional, Tuple
 from models import User
-from services import UserService
+from services import UserService, UserIdentity, user_identity_cache
 from database import get_database
+from cache import TTLCache
 import os
 import logging
 
@@ -34,11 +40,165 @@ if not BOT_TOKEN:
     # For debugging, we can use a placeholder, but it's not secure.
     BOT_TOKEN = "8482163056:AAGYMcCmHUxvrzDXkBESZPGV_kGiUVHZh4I" # Fallback for safety, should not be used in prod
 
+# Сессионные токены (/api/auth/session): initData проверяется один раз, дальше
+# клиент присылает компактный подписанный токен "v1.<payload>.<signature>"
+SESSION_TOKEN_PREFIX = "v1."
+SESSION_TOKEN_TTL = int(os.getenv("SESSION_TOKEN_TTL", "3600"))  # секунды
+_SESSION_KEY = hmac.new(
+    b"SessionToken", (os.getenv("SECRET_KEY") or BOT_TOKEN).encode(), hashlib.sha256
+).digest()
+
+
+class SessionIdentity(NamedTuple):
+    """Пользователь из проверенного сессионного токена (без обращения к БД)"""
+    user_id: uuid.UUID
+    telegram_id: int
+    expires_at: int
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def issue_session_token(
+    user_id: uuid.UUID,
+    telegram_id: int,
+    ttl: int = SESSION_TOKEN_TTL
+) -> Tuple[str, SessionIdentity]:
+    """Подписанный HMAC-SHA256 токен с UUID пользователя и telegram_id; возвращает (токен, identity)"""
+    identity = SessionIdentity(user_id, int(telegram_id), int(time.time()) + ttl)
+    payload = _b64encode(json.dumps(
+        {"sub": str(identity.user_id), "tid": identity.telegram_id, "exp": identity.expires_at},
+        separators=(",", ":")
+    ).encode())
+    signature = _b64encode(hmac.new(_SESSION_KEY, payload.encode(), hashlib.sha256).digest())
+    return f"{SESSION_TOKEN_PREFIX}{payload}.{signature}", identity
+
+
+def is_session_token(credentials: str) -> bool:
+    return credentials.startswith(SESSION_TOKEN_PREFIX)
+
+
+def decode_session_token(token: str) -> SessionIdentity:
+    """Проверка подписи и срока действия токена, ValueError если токен недействителен"""
+    if not is_session_token(token):
+        raise ValueError("Not a session token")
+    try:
+        payload, signature = token[len(SESSION_TOKEN_PREFIX):].split(".")
+        signature = _b64decode(signature)
+    except ValueError as e:
+        raise ValueError(f"Invalid session token: {e}")
+    expected = hmac.new(_SESSION_KEY, payload.encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise ValueError("Invalid session token signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+        identity = SessionIdentity(uuid.UUID(claims["sub"]), int(claims["tid"]), int(claims["exp"]))
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid session token: {e}")
+    if identity.expires_at < time.time():
+        raise ValueError("Session token expired")
+    return identity
+
+
+async def get_session_identity(
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+) -> SessionIdentity:
+    """Зависимость: пользователь из сессионного токена, без разбора initData и без SELECT"""
+    try:
+        return decode_session_token(credentials.credentials)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=str(e),
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
+def session_user_identity(session: SessionIdentity) -> UserIdentity:
+    """UserIdentity из сессионного токена; is_active берётся из кэша identity, если он там есть"""
+    cached = user_identity_cache.get(session.telegram_id)
+    if cached is not None and cached.id == session.user_id:
+        return cached
+    return UserIdentity(session.user_id, session.telegram_id, True)
+
+
+async def get_session_user(credentials: HTTPAuthorizationCredentials, db: AsyncSession) -> User:
+    """Строка пользователя из сессионного токена (по первичному ключу, без поиска по telegram_id)"""
+    session = await get_session_identity(credentials)
+    user = await UserService(db).get_user_by_id(session.user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session user no longer exists",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+
+async def get_secure_identity(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_database)
+) -> UserIdentity:
+    """Зависимость для */secure endpoints, которым нужен только id пользователя
+
+    Сессионный токен проверяется без обращения к БД; с initData пользователь
+    создаётся или обновляется из данных Telegram.
+    """
+    if is_session_token(credentials.credentials):
+        return session_user_identity(await get_session_identity(credentials))
+    user_data = await verify_telegram_auth_secure(credentials)
+    user = await create_or_get_user_from_telegram_data(user_data, db)
+    return UserIdentity(user.id, user.telegram_id, user.is_active)
+
+
+async def get_secure_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_database)
+) -> User:
+    """Зависимость для */secure endpoints: строка пользователя по сессионному токену или initData"""
+    if is_session_token(credentials.credentials):
+        return await get_session_user(credentials, db)
+    user_data = await verify_telegram_auth_secure(credentials)
+    return await create_or_get_user_from_telegram_data(user_data, db)
+
+
+# Срок жизни initData, отсчитываемый от auth_date (24 часа)
+INIT_DATA_MAX_AGE = 86400
+# Кэш уже проверенных initData: hash -> (init_data, данные пользователя)
+init_data_cache = TTLCache(
+    "telegram_init_data",
+    maxsize=int(os.getenv("INIT_DATA_CACHE_SIZE", "10000")),
+    ttl=INIT_DATA_MAX_AGE
+)
+_HASH_PATTERN = re.compile(r'(?:^|&)hash=([0-9a-fA-F]+)(?:&|$)')
+
+
+@lru_cache(maxsize=8)
+def webapp_secret_key(bot_token: str) -> bytes:
+    """Секретный ключ HMAC-SHA256("WebAppData", bot_token), вычисляется один раз на токен"""
+    return hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+
+
 def validate_telegram_webapp_data(init_data: str, bot_token: str) -> Dict:
     """
     Валидация данных Telegram WebApp согласно официальной документации
     https://core.telegram.org/bots/webapps#validating-data-received-via-the-web-app
+
+    Mini App присылает один и тот же initData всю сессию, поэтому результат
+    кэшируется по hash до истечения auth_date; повторная проверка — поиск в
+    словаре и сравнение строки initData с закэшированной.
     """
+    hash_match = _HASH_PATTERN.search(init_data)
+    if hash_match:
+        cached = init_data_cache.get((bot_token, hash_match.group(1)))
+        if cached is not None and hmac.compare_digest(cached[0], init_data):
+            return dict(cached[1])
+
     logger.info("Starting Telegram WebApp data validation.")
     logger.info(f"Received init_data: {init_data}")
 
@@ -66,8 +226,8 @@ def validate_telegram_webapp_data(init_data: str, bot_token: str) -> Dict:
         data_check_string = '\n'.join(data_check_arr)
         logger.info(f"Generated data_check_string for hashing: '{data_check_string}'")
         
-        # Создаем секретный ключ: HMAC-SHA256 от токена бота
-        secret_key = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+        # Секретный ключ: HMAC-SHA256 от токена бота (закэширован)
+        secret_key = webapp_secret_key(bot_token)
         
         # Вычисляем подпись
         calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
@@ -81,13 +241,15 @@ def validate_telegram_webapp_data(init_data: str, bot_token: str) -> Dict:
         logger.info("Hash validation successful.")
         
         # Проверяем временную метку (auth_date)
+        cache_ttl = INIT_DATA_MAX_AGE
         if 'auth_date' in parsed_data:
             auth_date = int(parsed_data['auth_date'])
             current_time = int(time.time())
             time_diff = current_time - auth_date
             logger.info(f"Token timestamp check: auth_date={auth_date}, current_time={current_time}, diff={time_diff}s")
+            cache_ttl = INIT_DATA_MAX_AGE - time_diff
             # Разрешаем окно в 24 часа для валидности токена
-            if time_diff > 86400:
+            if time_diff > INIT_DATA_MAX_AGE:
                 logger.warning(f"Token is older than 24 hours ({time_diff} seconds old).")
                 # В продакшене можно включить эту проверку
                 # raise ValueError("Token expired")
@@ -108,6 +270,9 @@ def validate_telegram_webapp_data(init_data: str, bot_token: str) -> Dict:
                     logger.error(f"JSON decode failed for user field: {e}")
                     raise ValueError("Invalid JSON in user data")
             logger.info(f"Successfully extracted user data for user_id: {user_data.get('id')}")
+            # Устаревшие initData не кэшируются и проверяются каждый раз
+            if cache_ttl > 0:
+                init_data_cache.set((bot_token, received_hash), (init_data, dict(user_data)), ttl=cache_ttl)
             return user_data
         else:
             logger.error("Validation failed: 'user' not found in parsed_data.")
@@ -172,6 +337,10 @@ async def get_current_user_secure(
     Получение текущего пользователя с надежной проверкой
     """
     try:
+        if is_session_token(credentials.credentials):
+            # Сессионный токен уже содержит UUID пользователя
+            return await get_session_user(credentials, db)
+        
         # Верифицируем аутентификацию
         user_data = await verify_telegram_auth_secure(credentials)
         telegram_id = user_data.get('id')
@@ -184,9 +353,9 @@ async def get_current_user_secure(
         
         logger.info(f"Looking up user in database: telegram_id={telegram_id}")
         
-        # Получаем пользователя из базы данных
+        # Получаем пользователя из базы данных (один раз за запрос, см. UserService.get_current_user)
         user_service = UserService(db)
-        user = await user_service.get_user_by_telegram_id(int(telegram_id))
+        user = await user_service.get_current_user(int(telegram_id))
         
         if not user:
             logger.info(f"User not found in database: telegram_id={telegram_id}")
@@ -207,59 +376,82 @@ async def get_current_user_secure(
             detail="Internal server error during user retrieval"
         )
 
+# Поля пользователя, которые приходят из Telegram при каждом входе
+TELEGRAM_USER_FIELDS = ('username', 'first_name', 'last_name', 'photo_url')
+
+
+def _telegram_upsert_statement():
+    """INSERT ... ON CONFLICT (telegram_id) DO UPDATE только при изменении полей Telegram
+
+    Если строка уже есть и поля не изменились, INSERT не выполняется вовсе
+    (SELECT ... WHERE NOT EXISTS), поэтому чтение профиля не блокирует строку
+    и не пишет WAL; строка тогда берётся из CTE existing. Всё — один запрос.
+    """
+    returning = ", ".join(column.name for column in User.__table__.columns)
+    fields = ", ".join(TELEGRAM_USER_FIELDS)
+    current = ", ".join(f"users.{field}" for field in TELEGRAM_USER_FIELDS)
+    incoming = ", ".join(f"EXCLUDED.{field}" for field in TELEGRAM_USER_FIELDS)
+    # Явные типы: в INSERT ... SELECT Postgres не выводит их из целевых столбцов
+    params = ", ".join(f"CAST(:{field} AS TEXT)" for field in TELEGRAM_USER_FIELDS)
+    updates = ", ".join(f"{field} = EXCLUDED.{field}" for field in TELEGRAM_USER_FIELDS)
+    stmt = text(f"""
+        WITH existing AS (
+            SELECT {returning} FROM users WHERE telegram_id = CAST(:telegram_id AS BIGINT)
+        ),
+        upsert AS (
+            INSERT INTO users (id, telegram_id, {fields}, is_active)
+            SELECT gen_random_uuid(), CAST(:telegram_id AS BIGINT), {params}, true
+            WHERE NOT EXISTS (
+                SELECT 1 FROM existing
+                WHERE ({fields}) IS NOT DISTINCT FROM ({params})
+            )
+            ON CONFLICT (telegram_id) DO UPDATE
+            SET {updates}, updated_at = now()
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING {returning}
+        )
+        SELECT {returning} FROM upsert
+        UNION ALL
+        SELECT {returning} FROM existing WHERE NOT EXISTS (SELECT 1 FROM upsert)
+    """).columns(*User.__table__.columns)
+    return select(User).from_statement(stmt).execution_options(populate_existing=True)
+
+
+TELEGRAM_UPSERT_STATEMENT = _telegram_upsert_statement()
+
+
 async def create_or_get_user_from_telegram_data(
     user_data: Dict,
     db: AsyncSession
 ) -> User:
     """
     Создает или получает пользователя на основе данных Telegram
+
+    Один запрос (см. _telegram_upsert_statement): новый пользователь
+    создаётся, изменившиеся поля Telegram обновляются, а неизменённый
+    профиль только читается.
     """
     try:
         telegram_id = int(user_data.get('id'))
         
         logger.info(f"Creating or getting user for telegram_id: {telegram_id}")
         
-        user_service = UserService(db)
+        params = {field: user_data.get(field) for field in TELEGRAM_USER_FIELDS}
+        result = await db.execute(TELEGRAM_UPSERT_STATEMENT, {'telegram_id': telegram_id, **params})
+        user = result.scalars().one_or_none()
         
-        # Пытаемся найти существующего пользователя
-        existing_user = await user_service.get_user_by_telegram_id(telegram_id)
+        if user is None:
+            # Строку вставила параллельная транзакция уже после снимка existing
+            user = await UserService(db).get_user_by_telegram_id(telegram_id)
         
-        if existing_user:
-            logger.info(f"Found existing user: {existing_user.id}")
-            # Обновляем базовую информацию из Telegram
-            existing_user.username = user_data.get('username')
-            existing_user.first_name = user_data.get('first_name')
-            existing_user.last_name = user_data.get('last_name')
-            existing_user.photo_url = user_data.get('photo_url')
-            
-            await db.commit()
-            await db.refresh(existing_user)
-            return existing_user
-        else:
-            logger.info(f"Creating new user for telegram_id: {telegram_id}")
-            # Создаем нового пользователя с базовой информацией из Telegram
-            from schemas import UserCreate
-            
-            user_create_data = UserCreate(
-                telegram_id=telegram_id,
-                username=user_data.get('username'),
-                first_name=user_data.get('first_name'),
-                last_name=user_data.get('last_name'),
-                photo_url=user_data.get('photo_url')
-            )
-            
-            # Use existing service method to create or update by telegram_id
-            # This guarantees unique constraint satisfaction and sets base fields
-            new_user = await user_service.create_or_update_user(
-                telegram_id=telegram_id,
-                user_data=user_create_data
-            )
-            logger.info(f"Created new user: {new_user.id}")
-            return new_user
+        # Новый пользователь ещё без локации и радиуса, поэтому колоды свайпов не затрагиваются
+        await db.commit()
+        logger.info(f"Resolved user: {user.id}")
+        return user
             
     except Exception as e:
         logger.error(f"Error creating/getting user: {e}", exc_info=True)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing user data: {str(e)}"
-        )
\ No newline at end of file
+        )
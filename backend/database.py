@@ -1,10 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import text
+from sqlalchemy import text, event
 from models import Base
 import os
 import asyncio
-from typing import AsyncGenerator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncGenerator, Iterator, List, Optional
 import logging
 
 # Database URL
@@ -17,6 +19,26 @@ engine = create_async_engine(
     future=True,
 )
 
+# Query-count instrumentation: counts statements sent to the database
+# while a count_queries() block is active in the current context
+_query_counter: ContextVar[Optional[List[int]]] = ContextVar("query_counter", default=None)
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+@contextmanager
+def count_queries() -> Iterator[List[int]]:
+    """Count database round trips, e.g. `with count_queries() as n: ...; n[0]`"""
+    counter = [0]
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
 # Create async session maker
 async_session_maker = async_sessionmaker(
     engine,
@@ -24,6 +46,132 @@ async_session_maker = async_sessionmaker(
     expire_on_commit=False
 )
 
+# Likes + mutual-match detection in one round trip (see MatchingService.like_users);
+# kept in sync with init.sql
+LIKE_USERS_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION like_users_and_match(p_liker UUID, p_liked UUID[])
+RETURNS TABLE (target_id UUID, liked BOOLEAN, matched BOOLEAN) AS $$
+DECLARE
+    v_new UUID[];
+    v_mutual UUID[];
+BEGIN
+    -- Serialize likes within each pair (in key order, so batches can't
+    -- deadlock): the second of two concurrent mutual likes waits here and
+    -- its statements below see the first one's like
+    PERFORM pg_advisory_xact_lock(k.key)
+    FROM (
+        SELECT DISTINCT hashtextextended(LEAST(p_liker, t.id)::text || GREATEST(p_liker, t.id)::text, 0) AS key
+        FROM unnest(p_liked) AS t(id)
+        ORDER BY 1
+    ) k;
+
+    -- One multi-row insert; existing likes are skipped by UNIQUE(liker_id, liked_id).
+    -- Unknown or deleted users are skipped too (KEY SHARE keeps them until commit)
+    -- instead of failing the whole batch on the foreign key
+    WITH inserted AS (
+        INSERT INTO user_likes (id, liker_id, liked_id)
+        SELECT gen_random_uuid(), p_liker, t.id
+        FROM (SELECT DISTINCT unnest(p_liked) AS id) t
+        JOIN users u ON u.id = t.id
+        WHERE t.id <> p_liker
+        FOR KEY SHARE OF u
+        ON CONFLICT (liker_id, liked_id) DO NOTHING
+        RETURNING user_likes.liked_id
+    )
+    SELECT COALESCE(array_agg(inserted.liked_id), '{}') INTO v_new FROM inserted;
+
+    SELECT COALESCE(array_agg(ul.liker_id), '{}') INTO v_mutual
+    FROM user_likes ul
+    WHERE ul.liked_id = p_liker AND ul.liker_id = ANY(v_new);
+
+    -- May already exist if trigger_create_match is installed
+    INSERT INTO user_matches (id, user1_id, user2_id)
+    SELECT gen_random_uuid(), LEAST(p_liker, m.id), GREATEST(p_liker, m.id)
+    FROM unnest(v_mutual) AS m(id)
+    ON CONFLICT (user1_id, user2_id) DO NOTHING;
+
+    -- Unknown users get no row
+    RETURN QUERY
+    SELECT t.id, t.id = ANY(v_new), t.id = ANY(v_mutual)
+    FROM (SELECT DISTINCT unnest(p_liked) AS id) t
+    WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = t.id);
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# users.search_area (buffered search circle for reverse geo-matching, see
+# ListingService.get_interested_users): column for databases created before
+# it existed, sync trigger and backfill; kept in sync with init.sql
+USER_SEARCH_AREA_SQL = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS search_area geography(POLYGON, 4326)",
+    "CREATE INDEX IF NOT EXISTS idx_users_search_area ON users USING GIST(search_area)",
+    """
+CREATE OR REPLACE FUNCTION update_user_search_area()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.search_location IS NULL OR NEW.search_radius IS NULL THEN
+        NEW.search_area := NULL;
+    ELSE
+        NEW.search_area := ST_Buffer(NEW.search_location, NEW.search_radius);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+""",
+    "DROP TRIGGER IF EXISTS trigger_user_search_area ON users",
+    """
+CREATE TRIGGER trigger_user_search_area
+    BEFORE INSERT OR UPDATE OF search_location, search_radius ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION update_user_search_area()
+""",
+    """
+UPDATE users SET search_area = ST_Buffer(search_location, search_radius)
+WHERE search_area IS NULL AND search_location IS NOT NULL AND search_radius IS NOT NULL
+""",
+]
+
+# users.price_range (budget as int4range for && overlap filters) for databases
+# created before it existed; kept in sync with init.sql
+USER_PRICE_RANGE_SQL = [
+    """
+ALTER TABLE users ADD COLUMN IF NOT EXISTS price_range int4range
+    GENERATED ALWAYS AS (int4range(price_min, price_max, '[]')) STORED
+""",
+    "CREATE INDEX IF NOT EXISTS idx_users_location_price_range ON users USING GIST(search_location, price_range)",
+]
+
+# Geometry-space GiST index on listings.location (map clusters and vector
+# tiles) for databases created before it existed; kept in sync with init.sql
+LISTING_GEOMETRY_INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_listings_location_geometry ON listings USING GIST((location::geometry))",
+]
+
+# listings.updated_at (indexed) bumped on every UPDATE, also by raw SQL and
+# external scripts (ListingService.refresh_listing_index and
+# poll_listing_changes rely on it); kept in sync with init.sql
+LISTING_UPDATED_AT_SQL = [
+    "CREATE INDEX IF NOT EXISTS idx_listings_updated_at ON listings(updated_at)",
+    """
+CREATE OR REPLACE FUNCTION touch_listing_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+""",
+    "DROP TRIGGER IF EXISTS trigger_listing_updated_at ON listings",
+    """
+CREATE TRIGGER trigger_listing_updated_at
+    BEFORE UPDATE ON listings
+    FOR EACH ROW
+    EXECUTE FUNCTION touch_listing_updated_at()
+""",
+]
+
 async def get_database() -> AsyncGenerator[AsyncSession, None]:
     """Dependency to get database session"""
     async with async_session_maker() as session:
@@ -71,4 +219,23 @@ async def init_database():
         
         # Create all tables
         await conn.run_sync(Base.metadata.create_all)
-        logging.info("Database tables created successfully")
\ No newline at end of file
+        logging.info("Database tables created successfully")
+        
+        await conn.execute(text(LIKE_USERS_FUNCTION_SQL))
+        logging.info("like_users_and_match function ensured")
+        
+        for statement in USER_SEARCH_AREA_SQL:
+            await conn.execute(text(statement))
+        logging.info("users.search_area trigger ensured")
+        
+        for statement in USER_PRICE_RANGE_SQL:
+            await conn.execute(text(statement))
+        logging.info("users.price_range column ensured")
+        
+        for statement in LISTING_GEOMETRY_INDEX_SQL:
+            await conn.execute(text(statement))
+        logging.info("listings.location geometry index ensured")
+        
+        for statement in LISTING_UPDATED_AT_SQL:
+            await conn.execute(text(statement))
+        logging.info("listings.updated_at index and trigger ensured")
\ No newline at end of file
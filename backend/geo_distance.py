@@ -0,0 +1,87 @@
+"""
+Векторизованные гео-расчёты на NumPy (haversine + bounding-box префильтр)
+
+Все функции принимают одну точку (lat, lon) и массивы координат кандидатов;
+отсутствующие координаты (None/NaN) никогда не попадают в результат.
+"""
+import math
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Радиус Земли в метрах
+EARTH_RADIUS_M = 6371000.0
+# Длина одного градуса широты в метрах
+METERS_PER_DEGREE = 111320.0
+
+
+def as_coordinate_array(values: Sequence) -> np.ndarray:
+    """Массив float64, None превращается в NaN"""
+    return np.asarray(values, dtype=np.float64)
+
+
+def bounding_box(lat: float, lon: float, radius: float) -> Tuple[float, float, float, float]:
+    """(min_lat, max_lat, min_lon, max_lon) квадрата, описанного вокруг круга radius метров"""
+    lat_span = radius / METERS_PER_DEGREE
+    lon_span = radius / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+    return lat - lat_span, lat + lat_span, lon - lon_span, lon + lon_span
+
+
+def bounding_box_mask(lat: float, lon: float, radius, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Маска точек внутри описанного квадрата; radius может быть массивом"""
+    lat_span = np.asarray(radius, dtype=np.float64) / METERS_PER_DEGREE
+    lon_span = lat_span / max(math.cos(math.radians(lat)), 1e-6)
+    return (np.abs(lats - lat) <= lat_span) & (np.abs(lons - lon) <= lon_span)
+
+
+def haversine_distances(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Расстояния в метрах от (lat, lon) до каждой точки (формула Haversine)"""
+    lat_rad = math.radians(lat)
+    lats_rad = np.radians(lats)
+    dlat = lats_rad - lat_rad
+    dlon = np.radians(lons - lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat_rad) * np.cos(lats_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_between(lats1, lons1, lats2, lons2) -> np.ndarray:
+    """Поэлементные расстояния в метрах между точками двух массивов (с broadcasting)"""
+    lats1_rad = np.radians(lats1)
+    lats2_rad = np.radians(lats2)
+    dlat = lats2_rad - lats1_rad
+    dlon = np.radians(np.subtract(lons2, lons1))
+    a = np.sin(dlat / 2) ** 2 + np.cos(lats1_rad) * np.cos(lats2_rad) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def points_within_radius(
+    lat: float,
+    lon: float,
+    radius: float,
+    lats: np.ndarray,
+    lons: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы точек в радиусе radius метров и расстояния до них (в исходном порядке)"""
+    candidates = np.flatnonzero(bounding_box_mask(lat, lon, radius, lats, lons))
+    distances = haversine_distances(lat, lon, lats[candidates], lons[candidates])
+    keep = distances <= radius
+    return candidates[keep], distances[keep]
+
+
+def intersecting_search_areas(
+    lat: float,
+    lon: float,
+    radius: float,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    radii: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы зон поиска, пересекающихся с кругом (lat, lon, radius), и расстояния между центрами
+
+    Зоны пересекаются, если расстояние между центрами не больше суммы радиусов.
+    """
+    reach = radius + radii
+    candidates = np.flatnonzero(bounding_box_mask(lat, lon, reach, lats, lons))
+    distances = haversine_distances(lat, lon, lats[candidates], lons[candidates])
+    keep = distances <= reach[candidates]
+    return candidates[keep], distances[keep]
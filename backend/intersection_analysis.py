@@ -0,0 +1,241 @@
+"""
+Анализ пересечений зон поиска всех пар пользователей (оценка ёмкости рынка матчинга)
+
+Пользователи раскладываются в сетку с ячейкой 2 * max(radius): пересекающиеся
+зоны (расстояние между центрами <= r1 + r2) могут лежать только в одной или
+соседних ячейках. Каждая пара ячеек считается векторизованно (haversine на
+матрице блок x ячейка), задачи раздаются пулу процессов, а найденные пары
+отдаются потоком по мере готовности.
+
+CLI:
+    python intersection_analysis.py --db social_rent.db --output pairs.csv
+    python intersection_analysis.py --synthetic 100000 --workers 8
+"""
+import argparse
+import csv
+import math
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from geo_distance import METERS_PER_DEGREE, as_coordinate_array, haversine_between
+
+# Запас на неточность плоской проекции (сетка и префильтр) относительно haversine
+GRID_SAFETY_MARGIN = 1.05
+PREFILTER_MARGIN = 1.01
+# Максимум элементов матрицы расстояний в одной задаче (ограничивает память воркера)
+MAX_BLOCK_ELEMENTS = 1_000_000
+# Соседи «вперёд»: каждая пара соседних ячеек обрабатывается ровно один раз
+_FORWARD_NEIGHBOURS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+# Отсортированные по ячейкам массивы воркера (заполняются в _init_worker)
+_lats = _lons = _radii = None
+
+Task = Tuple[int, int, int, int, bool]
+PairBatch = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def _init_worker(lats: np.ndarray, lons: np.ndarray, radii: np.ndarray):
+    global _lats, _lons, _radii
+    _lats, _lons, _radii = lats, lons, radii
+
+
+def _block_pairs(task: Task) -> PairBatch:
+    """Пересекающиеся пары строк [a_start, a_stop) x столбцов [b_start, b_stop)
+
+    Матрица блока сначала отсекается по плоскому расстоянию (без тригонометрии),
+    точный haversine считается только для оставшихся пар. Для одной и той же
+    ячейки (same_cell) берутся только пары с j > i. Индексы — позиции в
+    отсортированных массивах.
+    """
+    a_start, a_stop, b_start, b_stop, same_cell = task
+    a_lats, a_lons, a_radii = _lats[a_start:a_stop], _lons[a_start:a_stop], _radii[a_start:a_stop]
+    b_lats, b_lons, b_radii = _lats[b_start:b_stop], _lons[b_start:b_stop], _radii[b_start:b_stop]
+
+    # Префильтр на локальной проекции (метры), временные массивы переиспользуются
+    dlat = np.subtract.outer(a_lats, b_lats)
+    dlat *= dlat
+    squared = np.subtract.outer(a_lons, b_lons)
+    squared *= np.cos(np.radians(a_lats))[:, None]
+    squared *= squared
+    squared += dlat
+    squared *= METERS_PER_DEGREE * METERS_PER_DEGREE
+    reach = np.add.outer(a_radii, b_radii)
+    reach *= PREFILTER_MARGIN
+    reach *= reach
+    keep = squared <= reach
+    if same_cell:
+        keep &= np.arange(b_start, b_stop)[None, :] > np.arange(a_start, a_stop)[:, None]
+    i, j = np.nonzero(keep)
+
+    distances = haversine_between(a_lats[i], a_lons[i], b_lats[j], b_lons[j])
+    exact = distances <= a_radii[i] + b_radii[j]
+    return i[exact] + a_start, j[exact] + b_start, distances[exact]
+
+
+def _chunk_pairs(tasks: List[Task]) -> PairBatch:
+    """Все пары пачки задач одним результатом (меньше обменов между процессами)"""
+    results = [_block_pairs(task) for task in tasks]
+    return tuple(np.concatenate(parts) for parts in zip(*results))
+
+
+def _plan_tasks(cells: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> Iterator[Task]:
+    """Задачи (блок строк ячейки, соседняя ячейка) для всех пар соседних ячеек"""
+    positions = {(int(row), int(col)): index for index, (row, col) in enumerate(cells)}
+    for index, (row, col) in enumerate(cells):
+        start, stop = int(starts[index]), int(stops[index])
+        neighbours = [(index, True)]
+        for d_row, d_col in _FORWARD_NEIGHBOURS:
+            other = positions.get((int(row) + d_row, int(col) + d_col))
+            if other is not None:
+                neighbours.append((other, False))
+        for other, same_cell in neighbours:
+            b_start, b_stop = int(starts[other]), int(stops[other])
+            block = max(1, MAX_BLOCK_ELEMENTS // max(b_stop - b_start, 1))
+            for a_start in range(start, stop, block):
+                yield a_start, min(a_start + block, stop), b_start, b_stop, same_cell
+
+
+def intersecting_pairs(
+    lats,
+    lons,
+    radii,
+    workers: Optional[int] = None,
+    chunksize: int = 16
+) -> Iterator[PairBatch]:
+    """Поток пачек (i, j, distance) пересекающихся зон поиска, i < j
+
+    i и j — индексы во входных массивах, distance — расстояние между центрами
+    в метрах. Пользователи без координат или радиуса пропускаются.
+    workers=1 считает в текущем процессе, None — по числу CPU.
+    """
+    lats, lons, radii = as_coordinate_array(lats), as_coordinate_array(lons), as_coordinate_array(radii)
+    valid = np.flatnonzero(~(np.isnan(lats) | np.isnan(lons) | np.isnan(radii)))
+    if valid.size < 2:
+        return
+
+    # Ячейка с запасом покрывает максимальное r1 + r2; ширина по долготе — по самой высокой широте
+    cell_m = 2 * float(radii[valid].max()) * GRID_SAFETY_MARGIN or 1.0
+    max_abs_lat = min(float(np.abs(lats[valid]).max()), 89.0)
+    cell_lat = cell_m / METERS_PER_DEGREE
+    cell_lon = cell_m / (METERS_PER_DEGREE * math.cos(math.radians(max_abs_lat)))
+    rows = np.floor(lats[valid] / cell_lat).astype(np.int64)
+    cols = np.floor(lons[valid] / cell_lon).astype(np.int64)
+
+    # Сортировка по ячейке: каждая ячейка — непрерывный срез массивов
+    order = np.lexsort((cols, rows))
+    original = valid[order]
+    keys = np.stack((rows[order], cols[order]), axis=1)
+    boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [original.size]))
+    cells = keys[starts]
+
+    arrays = (lats[original], lons[original], radii[original])
+    tasks = _plan_tasks(cells, starts, stops)
+    chunks = iter(lambda: list(islice(tasks, chunksize)), [])
+    workers = workers or os.cpu_count() or 1
+
+    def ordered(batch: PairBatch) -> PairBatch:
+        # Пары соседних ячеек могут прийти как (j, i)
+        i, j, distances = batch
+        i, j = original[i], original[j]
+        return np.minimum(i, j), np.maximum(i, j), distances
+
+    if workers == 1:
+        _init_worker(*arrays)
+        for chunk in chunks:
+            batch = _chunk_pairs(chunk)
+            if batch[0].size:
+                yield ordered(batch)
+        return
+
+    # Не больше 2 * workers пачек в работе: результаты не копятся, если потребитель медленный
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=arrays) as executor:
+        pending = set()
+        for chunk in chunks:
+            pending.add(executor.submit(_chunk_pairs, chunk))
+            if len(pending) < 2 * workers:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = future.result()
+                if batch[0].size:
+                    yield ordered(batch)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch = future.result()
+                if batch[0].size:
+                    yield ordered(batch)
+
+
+def load_active_users(db_path: str) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """(ids, lats, lons, radii) активных пользователей из SQLite-базы app_full"""
+    with sqlite3.connect(db_path) as conn:
+        rows = conn.execute(
+            'SELECT id, search_lat, search_lon, search_radius FROM users WHERE is_active = 1'
+        ).fetchall()
+    ids = [row[0] for row in rows]
+    return (
+        ids,
+        as_coordinate_array([row[1] for row in rows]),
+        as_coordinate_array([row[2] for row in rows]),
+        as_coordinate_array([row[3] for row in rows]),
+    )
+
+
+def synthetic_users(count: int, seed: int = 42) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    """Случайные пользователи в пределах Москвы (для бенчмарка)"""
+    rng = np.random.default_rng(seed)
+    return (
+        [str(index) for index in range(count)],
+        rng.uniform(55.55, 55.95, count),
+        rng.uniform(37.35, 37.85, count),
+        rng.integers(500, 3000, count).astype(np.float64),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Пары пользователей с пересекающимися зонами поиска")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--db", help="SQLite-база app_full (таблица users)")
+    source.add_argument("--synthetic", type=int, metavar="N", help="N случайных пользователей в Москве")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов (по умолчанию — CPU)")
+    parser.add_argument("--output", help="CSV user1_id,user2_id,distance_m (по умолчанию только статистика)")
+    args = parser.parse_args(argv)
+
+    ids, lats, lons, radii = load_active_users(args.db) if args.db else synthetic_users(args.synthetic)
+
+    started = time.perf_counter()
+    total = 0
+    output = open(args.output, "w", newline="") if args.output else None
+    try:
+        writer = csv.writer(output) if output else None
+        for i, j, distances in intersecting_pairs(lats, lons, radii, workers=args.workers):
+            total += i.size
+            if writer:
+                writer.writerows(
+                    (ids[a], ids[b], round(float(d), 2)) for a, b, d in zip(i, j, distances)
+                )
+    finally:
+        if output:
+            output.close()
+
+    users = len(ids)
+    print(
+        f"{users} users, {users * (users - 1) // 2} pairs, {total} intersecting, "
+        f"{time.perf_counter() - started:.2f} s",
+        file=sys.stderr
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
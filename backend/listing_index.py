@@ -0,0 +1,206 @@
+"""
+In-process spatial index snapshot of active listings.
+
+Listings are bucketed into a regular lat/lon grid (cells of roughly
+`cell_size` meters around Moscow); a radius query only scans the cells
+overlapping the bounding box of the search circle and computes exact
+haversine distances with NumPy inside each cell. The snapshot is loaded at
+startup and refreshed incrementally by ListingService (fully reloaded when
+rows were deleted); when it has not been refreshed for `max_age` seconds it
+reports itself stale and callers fall back to PostGIS.
+"""
+import math
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from schemas import ListingResponse
+from geo_distance import METERS_PER_DEGREE, bounding_box, haversine_distances
+
+LISTING_INDEX_ENABLED = os.getenv("LISTING_INDEX_ENABLED", "false").lower() == "true"
+LISTING_INDEX_CELL_SIZE = float(os.getenv("LISTING_INDEX_CELL_SIZE", "1000"))  # meters
+LISTING_INDEX_MAX_AGE = float(os.getenv("LISTING_INDEX_MAX_AGE", "30"))  # seconds
+LISTING_INDEX_REFRESH_INTERVAL = float(os.getenv("LISTING_INDEX_REFRESH_INTERVAL", "10"))  # seconds
+
+
+class _Bucket:
+    """Listings of one grid cell plus lazily rebuilt coordinate/price arrays"""
+    __slots__ = ("listings", "items", "lats", "lons", "prices", "dirty")
+
+    def __init__(self):
+        self.listings: Dict[uuid.UUID, ListingResponse] = {}
+        self.items: List[ListingResponse] = []
+        self.lats = self.lons = self.prices = None
+        self.dirty = True
+
+    def arrays(self):
+        if self.dirty:
+            self.items = list(self.listings.values())
+            count = len(self.items)
+            self.lats = np.fromiter((item.lat for item in self.items), dtype=np.float64, count=count)
+            self.lons = np.fromiter((item.lon for item in self.items), dtype=np.float64, count=count)
+            self.prices = np.fromiter((item.price for item in self.items), dtype=np.int64, count=count)
+            self.dirty = False
+        return self.items, self.lats, self.lons, self.prices
+
+
+class ListingSpatialIndex:
+    """Grid-bucketed snapshot of active listings answering radius + price queries"""
+
+    def __init__(
+        self,
+        cell_size: float = LISTING_INDEX_CELL_SIZE,
+        max_age: float = LISTING_INDEX_MAX_AGE,
+        reference_lat: float = 55.75
+    ):
+        self.max_age = max_age
+        self._cell_lat = cell_size / METERS_PER_DEGREE
+        self._cell_lon = cell_size / (METERS_PER_DEGREE * math.cos(math.radians(reference_lat)))
+        self._buckets: Dict[Tuple[int, int], _Bucket] = {}
+        self._cells: Dict[uuid.UUID, Tuple[int, int]] = {}
+        self.loaded = False
+        self.refreshed_at: Optional[float] = None
+        self.synced_through: Optional[datetime] = None
+
+    def __len__(self) -> int:
+        return len(self._cells)
+
+    @property
+    def is_fresh(self) -> bool:
+        """True if the snapshot may be used instead of SQL"""
+        return (
+            self.loaded
+            and self.refreshed_at is not None
+            and time.monotonic() - self.refreshed_at <= self.max_age
+        )
+
+    def mark_stale(self):
+        """Force SQL fallback until the next successful refresh"""
+        self.refreshed_at = None
+
+    def touch(self, synced_through: Optional[datetime] = None):
+        """Record a successful refresh covering changes up to synced_through"""
+        if synced_through is not None and (self.synced_through is None or synced_through > self.synced_through):
+            self.synced_through = synced_through
+        self.refreshed_at = time.monotonic()
+
+    def build(self, listings: Iterable[ListingResponse], synced_through: Optional[datetime] = None):
+        """Replace the snapshot with the given active listings"""
+        self._buckets.clear()
+        self._cells.clear()
+        self.synced_through = None
+        for listing in listings:
+            self.upsert(listing)
+        self.loaded = True
+        self.touch(synced_through)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self._cell_lat), math.floor(lon / self._cell_lon)
+
+    def upsert(self, listing: ListingResponse):
+        """Insert or move a listing; inactive listings are removed"""
+        if not listing.is_active:
+            self.remove(listing.id)
+            return
+        cell = self._cell(listing.lat, listing.lon)
+        previous = self._cells.get(listing.id)
+        if previous is not None and previous != cell:
+            self.remove(listing.id)
+        bucket = self._buckets.get(cell)
+        if bucket is None:
+            bucket = self._buckets[cell] = _Bucket()
+        bucket.listings[listing.id] = listing
+        bucket.dirty = True
+        self._cells[listing.id] = cell
+
+    def remove(self, listing_id: uuid.UUID):
+        cell = self._cells.pop(listing_id, None)
+        if cell is None:
+            return
+        bucket = self._buckets[cell]
+        bucket.listings.pop(listing_id, None)
+        bucket.dirty = True
+        if not bucket.listings:
+            del self._buckets[cell]
+
+    def query(
+        self,
+        lat: float,
+        lon: float,
+        radius: float,
+        price_min: int = None,
+        price_max: int = None,
+        limit: int = 50,
+        after: Optional[Tuple[float, uuid.UUID]] = None
+    ) -> List[ListingResponse]:
+        """Listings within radius meters ordered by (distance, id), like ListingService.search_listings
+
+        `after` is the (distance_km, id) of the last listing of the previous page.
+        """
+        min_lat, max_lat, min_lon, max_lon = bounding_box(lat, lon, radius)
+        row_min, col_min = self._cell(min_lat, min_lon)
+        row_max, col_max = self._cell(max_lat, max_lon)
+
+        found_items: List[List[ListingResponse]] = []
+        found_positions = []
+        found_distances = []
+
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                bucket = self._buckets.get((row, col))
+                if bucket is None:
+                    continue
+                items, lats, lons, prices = bucket.arrays()
+                mask = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+                if price_min is not None:
+                    mask &= prices >= price_min
+                if price_max is not None:
+                    mask &= prices <= price_max
+                candidates = np.flatnonzero(mask)
+                if candidates.size == 0:
+                    continue
+
+                # Haversine on the bounding-box survivors only
+                distances = haversine_distances(lat, lon, lats[candidates], lons[candidates])
+
+                keep = distances <= radius
+                if after is not None:
+                    keep &= distances / 1000 >= after[0]
+                if not keep.any():
+                    continue
+                found_items.append(items)
+                found_positions.append(candidates[keep])
+                found_distances.append(distances[keep])
+
+        if not found_items:
+            return []
+
+        distances_km = np.concatenate(found_distances) / 1000
+        positions = np.concatenate(found_positions)
+        owners = np.repeat(np.arange(len(found_items)), [p.size for p in found_positions])
+        # Only the `limit` nearest (plus ties and rows on the cursor boundary) need a full sort
+        wanted = limit + (int(np.count_nonzero(distances_km == after[0])) if after is not None else 0)
+        if distances_km.size > wanted:
+            threshold = np.partition(distances_km, wanted - 1)[wanted - 1]
+            selected = np.flatnonzero(distances_km <= threshold)
+        else:
+            selected = np.arange(distances_km.size)
+        ranked = sorted(
+            ((float(distances_km[i]), found_items[owners[i]][positions[i]]) for i in selected),
+            key=lambda pair: (pair[0], pair[1].id)
+        )
+        if after is not None:
+            ranked = [pair for pair in ranked if (pair[0], pair[1].id) > after]
+
+        return [
+            item.model_copy(update={"distance": distance})
+            for distance, item in ranked[:limit]
+        ]
+
+
+# Process-wide snapshot used by ListingService (loaded only if LISTING_INDEX_ENABLED)
+listing_index = ListingSpatialIndex()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
@@ -12,7 +12,7 @@ import asyncio
 import logging
 import subprocess
 import sys
-from datetime import datetime
+from datetime import datetime, timezone
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,15 +21,26 @@ load_dotenv()
 from models import User, Listing, UserLike, UserMatch, ListingLike
 from schemas import (
     UserCreate, UserUpdate, UserResponse,
-    ListingResponse, UserProfileResponse,
-    LikeUserRequest, MatchResponse
+    ListingResponse, ListingCluster, UserProfileResponse,
+    LikeUserRequest, BatchLikeRequest, BatchLikeResponse, MatchResponse,
+    SessionTokenResponse
 )
 from database import get_database, init_database, async_session_maker
-from auth import verify_telegram_auth, get_current_user
+from auth import verify_telegram_auth, get_current_user, get_current_identity
 # Импорт новой безопасной аутентификации
-from auth_new import verify_telegram_auth_secure, get_current_user_secure, create_or_get_user_from_telegram_data
-from services import UserService, ListingService, MatchingService
+from auth_new import (
+    verify_telegram_auth_secure, get_current_user_secure, create_or_get_user_from_telegram_data,
+    issue_session_token, get_secure_identity, get_secure_user
+)
+from services import (
+    UserService, ListingService, MatchingService, UserIdentity,
+    encode_listing_cursor, decode_listing_cursor, encode_match_cursor, LISTING_CHANGE_POLL_INTERVAL,
+    LISTING_MAX_MIN_RESULTS, LISTING_MAX_RADIUS_LIMIT
+)
 from metro_stations import get_metro_stations_list, get_metro_station_info, search_metro_stations
+from listing_index import listing_index, LISTING_INDEX_ENABLED, LISTING_INDEX_REFRESH_INTERVAL
+from cache import cache_stats
+from swipe_deck import SWIPE_DECK_REFRESH_INTERVAL
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -85,6 +96,43 @@ async def generate_test_data(db: AsyncSession):
     except Exception as e:
         logger.error(f"Error during test data generation: {e}", exc_info=True)
 
+async def refresh_listing_index_periodically():
+    """Keep the in-process listing index in sync with the listings table"""
+    while True:
+        await asyncio.sleep(LISTING_INDEX_REFRESH_INTERVAL)
+        try:
+            async with async_session_maker() as db_session:
+                changed = await ListingService(db_session).refresh_listing_index()
+            if changed:
+                logger.info(f"Listing index refreshed: {changed} changed listings")
+        except Exception as e:
+            # Stale snapshot makes ListingService fall back to PostGIS
+            listing_index.mark_stale()
+            logger.error(f"Error refreshing listing index: {e}")
+
+async def poll_listing_changes_periodically():
+    """Drop cached listing results after listings were changed by another process"""
+    while True:
+        await asyncio.sleep(LISTING_CHANGE_POLL_INTERVAL)
+        try:
+            async with async_session_maker() as db_session:
+                if await ListingService(db_session).poll_listing_changes():
+                    logger.info("Listings changed, listing caches invalidated")
+        except Exception as e:
+            logger.error(f"Error polling listing changes: {e}")
+
+async def refresh_swipe_decks_periodically():
+    """Rebuild swipe decks affected by profile changes or close to expiry"""
+    while True:
+        await asyncio.sleep(SWIPE_DECK_REFRESH_INTERVAL)
+        try:
+            async with async_session_maker() as db_session:
+                rebuilt = await MatchingService(db_session).refresh_swipe_decks()
+            if rebuilt:
+                logger.info(f"Swipe decks rebuilt: {rebuilt}")
+        except Exception as e:
+            logger.error(f"Error refreshing swipe decks: {e}")
+
 # Initialize FastAPI app
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -97,9 +145,26 @@ async def lifespan(app: FastAPI):
         logger.info("Application startup: Generating test data...")
         await generate_test_data(db_session)
     
+    refresh_task = None
+    if LISTING_INDEX_ENABLED:
+        try:
+            async with async_session_maker() as db_session:
+                loaded = await ListingService(db_session).load_listing_index()
+            logger.info(f"Listing index loaded: {loaded} active listings")
+        except Exception as e:
+            logger.error(f"Error loading listing index, using PostGIS only: {e}")
+        refresh_task = asyncio.create_task(refresh_listing_index_periodically())
+    else:
+        # The index refresh invalidates the caches itself
+        refresh_task = asyncio.create_task(poll_listing_changes_periodically())
+    swipe_deck_task = asyncio.create_task(refresh_swipe_decks_periodically())
+    
     logger.info("Application startup completed")
     yield
     # Shutdown - cleanup if needed
+    if refresh_task:
+        refresh_task.cancel()
+    swipe_deck_task.cancel()
     logger.info("Application shutdown")
 
 app = FastAPI(
@@ -117,6 +182,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Search-Radius"],
 )
 
 # Security
@@ -132,6 +198,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Hit/miss counters of the in-process caches"""
+    return cache_stats()
+
 @app.get("/api/test-auth")
 async def test_auth(
     current_user_data: dict = Depends(verify_telegram_auth_secure),
@@ -144,6 +215,26 @@ async def test_auth(
         "timestamp": datetime.utcnow().isoformat()
     }
 
+@app.post("/api/auth/session", response_model=SessionTokenResponse)
+async def create_session(
+    current_user_data: dict = Depends(verify_telegram_auth_secure),
+    db: AsyncSession = Depends(get_database)
+):
+    """Validate Telegram initData once and issue a short-lived session token
+
+    Send it as `Authorization: Bearer <token>` instead of initData: every
+    authenticated endpoint accepts it, and those that only need the user id
+    (get_current_identity, get_secure_identity) verify it without a database
+    lookup.
+    """
+    user = await create_or_get_user_from_telegram_data(current_user_data, db)
+    token, identity = issue_session_token(user.id, user.telegram_id)
+    return SessionTokenResponse(
+        token=token,
+        expires_at=datetime.fromtimestamp(identity.expires_at, tz=timezone.utc),
+        user_id=user.id
+    )
+
 # Metro stations endpoints
 @app.get("/api/metro/stations", response_model=List[str])
 async def get_metro_stations():
@@ -190,8 +281,13 @@ async def create_user(
             detail="No telegram_id provided"
         )
     
-    user = await user_service.create_or_update_user(telegram_id, user_data)
-    return user
+    try:
+        return await user_service.create_or_update_user(telegram_id, user_data)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
 
 @app.get("/api/users/me", response_model=UserResponse)
 async def get_current_user_profile(
@@ -215,45 +311,47 @@ async def update_user_profile(
     logger.info(f"User data: {user_data.dict(exclude_unset=True)}")
     logger.info(f"Current user telegram_id: {current_user.telegram_id}")
     
+    user_service = UserService(db)
     try:
-        # Normalize search_radius: accept km if small values (< 1000)
-        if user_data.search_radius is not None and user_data.search_radius < 1000:
-            user_data.search_radius = user_data.search_radius * 1000
-
-        # Validate metro station if provided
-        if user_data.metro_station:
-            info = get_metro_station_info(user_data.metro_station)
-            if not info:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Unknown metro station: {user_data.metro_station}"
-                )
-
-        user_service = UserService(db)
+        # search_radius < 1000 is normalized to meters by the service
         user = await user_service.update_user(current_user.id, user_data)
-        logger.info(f"Profile updated successfully for user {current_user.id}")
-        return user
-    except Exception as e:
-        logger.error(f"Error updating profile for user {current_user.id}: {str(e)}")
-        import traceback
-        logger.error(f"Full traceback: {traceback.format_exc()}")
-        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    logger.info(f"Profile updated successfully for user {current_user.id}")
+    return user
 
 @app.get("/api/users/potential-matches", response_model=list[UserProfileResponse])
 async def get_potential_matches(
     limit: int = 10,
-    current_user: User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get potential matches based on overlapping search areas"""
+    """Get potential matches based on overlapping search areas (from the precomputed swipe deck)"""
     matching_service = MatchingService(db)
-    matches = await matching_service.get_potential_matches(current_user.id, limit)
+    matches = await matching_service.get_swipe_deck(current_user.id, limit)
     return matches
 
+@app.post("/api/users/likes:batch", response_model=BatchLikeResponse)
+async def like_users_batch(
+    batch: BatchLikeRequest,
+    current_user: UserIdentity = Depends(get_current_identity),
+    db: AsyncSession = Depends(get_database)
+):
+    """Submit many swipes at once: likes are written in one multi-row insert"""
+    matching_service = MatchingService(db)
+    outcomes = await matching_service.like_users(current_user.id, batch.liked_ids, batch.skipped_ids)
+    return BatchLikeResponse(
+        liked=[user_id for user_id, outcome in outcomes.items() if outcome["liked"]],
+        matches=[user_id for user_id, outcome in outcomes.items() if outcome["match"]]
+    )
+
 @app.post("/api/users/{user_id}/like")
 async def like_user(
     user_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Like another user"""
@@ -267,53 +365,189 @@ async def like_user(
         )
     
     matching_service = MatchingService(db)
-    result = await matching_service.like_user(current_user.id, liked_user_id)
+    try:
+        result = await matching_service.like_user(current_user.id, liked_user_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
     return result
 
 @app.get("/api/users/matches", response_model=list[MatchResponse])
 async def get_user_matches(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = None,
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get user's matches (mutual likes)"""
+    """Get user's matches (mutual likes), newest first; next page via X-Next-Cursor"""
     matching_service = MatchingService(db)
-    matches = await matching_service.get_user_matches(current_user.id)
+    try:
+        matches = await matching_service.get_user_matches(current_user.id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    if len(matches) >= limit:
+        response.headers["X-Next-Cursor"] = encode_match_cursor(matches[-1])
     return matches
 
 # Listing endpoints
+def set_next_cursor(
+    response: Response,
+    listings: List[ListingResponse],
+    limit: int,
+    radius: int = None,
+    nearest: bool = False
+):
+    """Expose the keyset cursor of the next page via the X-Next-Cursor header"""
+    if listings and len(listings) >= limit:
+        response.headers["X-Next-Cursor"] = encode_listing_cursor(listings[-1], radius, nearest)
+
 @app.get("/api/listings/", response_model=list[ListingResponse])
 async def get_listings(
+    response: Response,
     lat: float = None,
     lon: float = None,
-    radius: int = 1000,  # meters
+    radius: int = None,  # meters; 1000 unless nearest=true
     price_min: int = None,
     price_max: int = None,
     limit: int = 50,
+    cursor: str = None,
+    nearest: bool = False,
     db: AsyncSession = Depends(get_database)
 ):
-    """Get listings based on location and filters"""
+    """Get listings based on location and filters
+
+    nearest=true returns the `limit` nearest listings via the KNN index,
+    optionally bounded by radius.
+    """
     listing_service = ListingService(db)
-    listings = await listing_service.search_listings(
-        lat=lat, lon=lon, radius=radius,
-        price_min=price_min, price_max=price_max,
-        limit=limit
-    )
+    try:
+        if cursor:
+            # Later pages keep the ordering of the first one
+            nearest = decode_listing_cursor(cursor).get("nearest", nearest)
+        listings = await listing_service.search_listings(
+            lat=lat, lon=lon, radius=radius,
+            price_min=price_min, price_max=price_max,
+            limit=limit, cursor=cursor, nearest=nearest
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, listings, limit, nearest=nearest)
     return listings
 
+@app.get("/api/listings/clusters", response_model=list[ListingCluster])
+async def get_listing_clusters(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=20),
+    price_min: int = None,
+    price_max: int = None,
+    db: AsyncSession = Depends(get_database)
+):
+    """Get listing clusters (count, centroid, min/median price) for a map viewport"""
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid bounding box"
+        )
+    listing_service = ListingService(db)
+    try:
+        return await listing_service.get_listing_clusters(
+            min_lat, min_lon, max_lat, max_lon, zoom,
+            price_min=price_min, price_max=price_max
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+@app.get("/api/listings/tiles/{z}/{x}/{y}.mvt")
+async def get_listing_tile(
+    z: int,
+    x: int,
+    y: int,
+    db: AsyncSession = Depends(get_database)
+):
+    """Get active listings as a Mapbox Vector Tile (price and rooms as attributes)"""
+    listing_service = ListingService(db)
+    try:
+        tile = await listing_service.get_listing_tile(z, x, y)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return Response(content=tile, media_type="application/vnd.mapbox-vector-tile")
+
 @app.get("/api/listings/search", response_model=list[ListingResponse])
 async def search_listings_for_user(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str = None,
+    radius: int = Query(None, ge=1, le=LISTING_MAX_RADIUS_LIMIT),  # meters, overrides the profile's search_radius
+    min_results: int = Query(None, ge=1, le=LISTING_MAX_MIN_RESULTS),
+    max_radius: int = Query(None, ge=1, le=LISTING_MAX_RADIUS_LIMIT),  # meters
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_database)
+):
+    """Get listings based on current user's search criteria
+
+    With min_results the radius is expanded server-side for sparse areas;
+    the radius actually used is returned in the X-Search-Radius header and
+    carried in X-Next-Cursor for the following pages.
+    """
+    listing_service = ListingService(db)
+    try:
+        listings, effective_radius, nearest = await listing_service.get_listings_for_user(
+            current_user, limit=limit, cursor=cursor, radius=radius,
+            min_results=min_results, max_radius=max_radius
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    response.headers["X-Search-Radius"] = str(effective_radius)
+    set_next_cursor(response, listings, limit, effective_radius, nearest)
+    return listings
+
+@app.get("/api/listings/match-budgets", response_model=list[ListingResponse])
+async def get_listings_within_match_budgets(
+    response: Response,
+    limit: int = 50,
+    cursor: str = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_database)
 ):
-    """Get listings based on current user's search criteria"""
+    """Listings in current user's search area that fit the budget of any of their matches"""
     listing_service = ListingService(db)
-    listings = await listing_service.get_listings_for_user(current_user)
+    try:
+        listings = await listing_service.get_listings_within_match_budgets(
+            current_user, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    set_next_cursor(response, listings, limit)
     return listings
 
 @app.post("/api/listings/{listing_id}/like")
 async def like_listing(
     listing_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Like a listing"""
@@ -332,7 +566,7 @@ async def like_listing(
 
 @app.get("/api/listings/liked", response_model=list[ListingResponse])
 async def get_liked_listings(
-    current_user: User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Get current user's liked listings"""
@@ -343,7 +577,7 @@ async def get_liked_listings(
 @app.get("/api/users/{user_id}/liked-listings", response_model=list[ListingResponse])
 async def get_user_liked_listings(
     user_id: str,
-    current_user: User = Depends(get_current_user),
+    current_user: UserIdentity = Depends(get_current_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Get liked listings of a matched user"""
@@ -374,58 +608,25 @@ async def get_user_liked_listings(
 @app.post("/api/users/secure", response_model=UserResponse)
 async def create_or_update_user_secure_endpoint(
     user_data: UserUpdate,
-    current_user_data: dict = Depends(verify_telegram_auth_secure),
+    current_user: UserIdentity = Depends(get_secure_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Безопасное создание или обновление пользователя"""
     try:
-        logger.info(f"Secure user create/update for telegram_id: {current_user_data.get('id')}")
-        
-        # Сначала создаем/получаем базового пользователя из Telegram данных
-        base_user = await create_or_get_user_from_telegram_data(current_user_data, db)
-        
-        # Теперь обновляем профиль пользовательскими данными
-        user_service = UserService(db)
-        
-        # Обновляем поля профиля
-        for field, value in user_data.dict(exclude_unset=True, exclude={'lat', 'lon'}).items():
-            if hasattr(base_user, field) and value is not None:
-                setattr(base_user, field, value)
-                logger.debug(f"Updated field {field} = {value}")
+        logger.info(f"Secure user create/update for telegram_id: {current_user.telegram_id}")
         
-        # Нормализуем search_radius: если явно передали значение < 1000, считаем, что это км
-        if user_data.search_radius is not None and user_data.search_radius < 1000:
-            user_data.search_radius = user_data.search_radius * 1000
-
-        # Обновляем локацию если указана станция метро
-        if user_data.metro_station:
-            from metro_stations import get_metro_station_info
-            station_info = get_metro_station_info(user_data.metro_station)
-            if station_info:
-                from sqlalchemy import func
-                location_text = f'POINT({station_info["lon"]} {station_info["lat"]})'
-                base_user.search_location = func.ST_GeogFromText(location_text)
-                logger.info(f"Updated location to: {user_data.metro_station}")
-            else:
-                logger.warning(f"Metro station not found: {user_data.metro_station}")
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Unknown metro station: {user_data.metro_station}"
-                )
-        elif user_data.lat is not None and user_data.lon is not None:
-            from sqlalchemy import func
-            location_text = f'POINT({user_data.lon} {user_data.lat})'
-            base_user.search_location = func.ST_GeogFromText(location_text)
-            logger.info(f"Updated location to coordinates: {user_data.lat}, {user_data.lon}")
+        # Одним UPDATE ... RETURNING обновляем профиль (null-поля не трогаем)
+        user = await UserService(db).update_user(current_user.id, user_data, skip_none=True)
         
-        # Сохраняем изменения
-        await db.commit()
-        await db.refresh(base_user)
+        logger.info(f"Successfully updated user profile: {user.id}")
         
-        logger.info(f"Successfully updated user profile: {base_user.id}")
-        
-        return base_user
+        return user
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error in secure user create/update: {e}")
         await db.rollback()
@@ -436,81 +637,34 @@ async def create_or_update_user_secure_endpoint(
 
 @app.get("/api/users/me/secure", response_model=UserResponse)
 async def get_current_user_profile_secure_endpoint(
-    current_user_data: dict = Depends(verify_telegram_auth_secure),
-    db: AsyncSession = Depends(get_database)
+    current_user: User = Depends(get_secure_user)
 ):
-    """Безопасное получение текущего профиля пользователя"""
-    try:
-        logger.info(f"Getting profile for telegram_id: {current_user_data.get('id')}")
-        
-        # Создаем/получаем пользователя если его нет
-        user = await create_or_get_user_from_telegram_data(current_user_data, db)
-        
-        logger.info(f"Successfully retrieved user profile: {user.id}")
-        return user
-        
-    except Exception as e:
-        logger.error(f"Error getting user profile: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to get user profile: {str(e)}"
-        )
+    """Безопасное получение текущего профиля пользователя (создаётся при первом входе с initData)"""
+    logger.info(f"Successfully retrieved user profile: {current_user.id}")
+    return current_user
 
 @app.put("/api/users/profile/secure", response_model=UserResponse)
 async def update_user_profile_secure_endpoint(
     user_data: UserUpdate,
-    current_user_data: dict = Depends(verify_telegram_auth_secure),
+    current_user: UserIdentity = Depends(get_secure_identity),
     db: AsyncSession = Depends(get_database)
 ):
     """Безопасное обновление профиля пользователя"""
     try:
-        logger.info(f"Secure profile update for telegram_id: {current_user_data.get('id')}")
-        
-        # Сначала создаем/получаем базового пользователя из Telegram данных
-        base_user = await create_or_get_user_from_telegram_data(current_user_data, db)
+        logger.info(f"Secure profile update for telegram_id: {current_user.telegram_id}")
         
-        # Теперь обновляем профиль пользовательскими данными
-        user_service = UserService(db)
+        # Одним UPDATE ... RETURNING обновляем профиль (null-поля не трогаем)
+        user = await UserService(db).update_user(current_user.id, user_data, skip_none=True)
         
-        # Обновляем поля профиля
-        for field, value in user_data.dict(exclude_unset=True, exclude={'lat', 'lon'}).items():
-            if hasattr(base_user, field) and value is not None:
-                setattr(base_user, field, value)
-                logger.debug(f"Updated field {field} = {value}")
+        logger.info(f"Successfully updated user profile: {user.id}")
         
-        # Нормализуем search_radius: если явно передали значение < 1000, считаем, что это км
-        if user_data.search_radius is not None and user_data.search_radius < 1000:
-            user_data.search_radius = user_data.search_radius * 1000
-
-        # Обновляем локацию если указана станция метро
-        if user_data.metro_station:
-            from metro_stations import get_metro_station_info
-            station_info = get_metro_station_info(user_data.metro_station)
-            if station_info:
-                from sqlalchemy import func
-                location_text = f'POINT({station_info["lon"]} {station_info["lat"]})'
-                base_user.search_location = func.ST_GeogFromText(location_text)
-                logger.info(f"Updated location to: {user_data.metro_station} -> {location_text}")
-            else:
-                logger.warning(f"Metro station not found: {user_data.metro_station}")
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Unknown metro station: {user_data.metro_station}"
-                )
-        elif user_data.lat is not None and user_data.lon is not None:
-            from sqlalchemy import func
-            location_text = f'POINT({user_data.lon} {user_data.lat})'
-            base_user.search_location = func.ST_GeogFromText(location_text)
-            logger.info(f"Updated location to coordinates: {user_data.lat}, {user_data.lon}")
-        
-        # Сохраняем изменения
-        await db.commit()
-        await db.refresh(base_user)
-        
-        logger.info(f"Successfully updated user profile: {base_user.id}")
-        
-        return base_user
+        return user
         
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         logger.error(f"Error in secure profile update: {e}")
         await db.rollback()
@@ -0,0 +1,153 @@
+"""
+Vectorized compatibility scoring of potential matches.
+
+MatchingService.get_potential_matches fetches the nearest candidates and
+ranks them with score_candidates: every component is computed with NumPy over
+the whole candidate array and normalized to [0, 1], then combined as a
+weighted mean. Missing attributes (no budget, no age) score 0 on that
+component. Weights come from the MATCH_WEIGHT_* environment variables.
+
+Run `python match_scoring.py` for a micro-benchmark.
+"""
+import os
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Candidates fetched (nearest first) and scored per potential-matches query
+MATCH_SCORING_POOL = int(os.getenv("MATCH_SCORING_POOL", "2000"))
+# Age difference (years) at which the age component drops to 1/e
+MATCH_AGE_SCALE = 5.0
+
+
+class MatchScoreWeights(NamedTuple):
+    price: float = 0.35  # overlap of price_min..price_max ranges
+    age: float = 0.15  # age proximity
+    overlap: float = 0.3  # overlap area of the two search circles
+    distance: float = 0.2  # proximity of the search points
+
+
+MATCH_SCORE_WEIGHTS = MatchScoreWeights(
+    price=float(os.getenv("MATCH_WEIGHT_PRICE", "0.35")),
+    age=float(os.getenv("MATCH_WEIGHT_AGE", "0.15")),
+    overlap=float(os.getenv("MATCH_WEIGHT_OVERLAP", "0.3")),
+    distance=float(os.getenv("MATCH_WEIGHT_DISTANCE", "0.2")),
+)
+
+
+def price_overlap_scores(
+    price_min: Optional[float],
+    price_max: Optional[float],
+    price_mins: np.ndarray,
+    price_maxs: np.ndarray
+) -> np.ndarray:
+    """Intersection over union of [price_min, price_max] and each candidate range"""
+    if price_min is None or price_max is None:
+        return np.zeros(price_mins.shape)
+    intersection = np.minimum(price_max, price_maxs) - np.maximum(price_min, price_mins)
+    union = np.maximum(price_max, price_maxs) - np.minimum(price_min, price_mins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Identical single-price "ranges" (zero union) overlap fully
+        scores = np.where(union > 0, intersection / union, (intersection == 0).astype(np.float64))
+    return np.nan_to_num(np.clip(scores, 0.0, 1.0), nan=0.0)
+
+
+def age_scores(age: Optional[float], ages: np.ndarray) -> np.ndarray:
+    """exp(-|age difference| / MATCH_AGE_SCALE)"""
+    if age is None:
+        return np.zeros(ages.shape)
+    return np.nan_to_num(np.exp(-np.abs(ages - age) / MATCH_AGE_SCALE), nan=0.0)
+
+
+def circle_overlap_scores(radius: float, radii: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """Intersection area of the two circles divided by the area of the smaller one"""
+    r1 = float(radius)
+    r2 = radii
+    d = np.maximum(distances, 1e-9)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        alpha = np.arccos(np.clip((d ** 2 + r1 ** 2 - r2 ** 2) / (2 * d * r1), -1.0, 1.0))
+        beta = np.arccos(np.clip((d ** 2 + r2 ** 2 - r1 ** 2) / (2 * d * r2), -1.0, 1.0))
+        kite = np.sqrt(np.clip((-d + r1 + r2) * (d + r1 - r2) * (d - r1 + r2) * (d + r1 + r2), 0.0, None))
+        lens = r1 ** 2 * alpha + r2 ** 2 * beta - 0.5 * kite
+        smaller = np.pi * np.minimum(r1, r2) ** 2
+        scores = np.where(
+            d >= r1 + r2, 0.0,
+            np.where(d <= np.abs(r1 - r2), 1.0, lens / smaller)
+        )
+    return np.nan_to_num(np.clip(scores, 0.0, 1.0), nan=0.0)
+
+
+def distance_scores(radius: float, radii: np.ndarray, distances: np.ndarray) -> np.ndarray:
+    """1 at the same point, 0 when the circles no longer touch"""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        scores = 1.0 - distances / (radius + radii)
+    return np.nan_to_num(np.clip(scores, 0.0, 1.0), nan=0.0)
+
+
+def score_candidates(
+    radius: float,
+    price_min: Optional[float],
+    price_max: Optional[float],
+    age: Optional[float],
+    radii: np.ndarray,
+    distances: np.ndarray,
+    price_mins: np.ndarray,
+    price_maxs: np.ndarray,
+    ages: np.ndarray,
+    weights: MatchScoreWeights = MATCH_SCORE_WEIGHTS
+) -> np.ndarray:
+    """Compatibility score in [0, 1] of each candidate with the current user
+
+    Distances and radii are in meters; candidate arrays are float64 with NaN
+    for missing values (see geo_distance.as_coordinate_array).
+    """
+    total = sum(weights)
+    if total <= 0:
+        return np.zeros(distances.shape)
+    scores = np.zeros(distances.shape)
+    if weights.price:
+        scores += weights.price * price_overlap_scores(price_min, price_max, price_mins, price_maxs)
+    if weights.age:
+        scores += weights.age * age_scores(age, ages)
+    if weights.overlap:
+        scores += weights.overlap * circle_overlap_scores(radius, radii, distances)
+    if weights.distance:
+        scores += weights.distance * distance_scores(radius, radii, distances)
+    return scores / total
+
+
+def rank_candidates(scores: np.ndarray, distances: np.ndarray, limit: int) -> np.ndarray:
+    """Indices of the `limit` best candidates: highest score first, nearest on ties"""
+    if scores.size > limit:
+        # Only the top `limit` (plus ties) need a full sort
+        threshold = np.partition(scores, scores.size - limit)[scores.size - limit]
+        selected = np.flatnonzero(scores >= threshold)
+    else:
+        selected = np.arange(scores.size)
+    order = np.lexsort((distances[selected], -scores[selected]))
+    return selected[order][:limit]
+
+
+if __name__ == "__main__":
+    import time
+
+    rng = np.random.default_rng(42)
+    count, runs = 5000, 200
+    radii = rng.integers(500, 10000, count).astype(np.float64)
+    distances = rng.uniform(0, 15000, count)
+    price_mins = rng.integers(20000, 80000, count).astype(np.float64)
+    price_maxs = price_mins + rng.integers(0, 60000, count)
+    ages = rng.integers(18, 60, count).astype(np.float64)
+    ages[rng.random(count) < 0.1] = np.nan
+
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        scores = score_candidates(3000, 40000, 70000, 28, radii, distances, price_mins, price_maxs, ages)
+        rank_candidates(scores, distances, 200)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    timings.sort()
+    p50, p99 = timings[runs // 2], timings[int(runs * 0.99)]
+    print(f"{count} candidates: p50 {p50:.3f} ms, p99 {p99:.3f} ms")
+    assert p50 < 5, "scoring must stay under 5 ms"
@@ -1,8 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, CheckConstraint, ARRAY, DECIMAL, BigInteger
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, CheckConstraint, ARRAY, DECIMAL, BigInteger, Index, UniqueConstraint, Computed
+from sqlalchemy.dialects.postgresql import UUID, INT4RANGE
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from geoalchemy2 import Geography
 import uuid
 
@@ -21,9 +21,13 @@ class User(Base):
     bio = Column(Text, nullable=True)
     price_min = Column(Integer, CheckConstraint('price_min >= 0'), nullable=True)
     price_max = Column(Integer, CheckConstraint('price_max >= price_min'), nullable=True)
+    # [price_min, price_max], unbounded on a missing side
+    price_range = Column(INT4RANGE, Computed("int4range(price_min, price_max, '[]')", persisted=True))
     metro_station = Column(String(255), nullable=True)
     search_location = Column(Geography('POINT', srid=4326), nullable=True)
-    search_radius = Column(Integer, CheckConstraint('search_radius > 0'), nullable=True)  # in meters
+    search_radius = Column(Integer, CheckConstraint('search_radius > 0'), nullable=True, index=True)  # in meters
+    # ST_Buffer(search_location, search_radius), maintained by trigger_user_search_area
+    search_area = Column(Geography('POLYGON', srid=4326), nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -33,6 +37,11 @@ class User(Base):
     likes_received = relationship("UserLike", foreign_keys="UserLike.liked_id", back_populates="liked")
     listing_likes = relationship("ListingLike", back_populates="user")
 
+    __table_args__ = (
+        # Spatial + budget-overlap prefilter of potential matches
+        Index('idx_users_location_price_range', 'search_location', 'price_range', postgresql_using='gist'),
+    )
+
 
 class Listing(Base):
     __tablename__ = "listings"
@@ -57,6 +66,15 @@ class Listing(Base):
     # Relationships
     likes = relationship("ListingLike", back_populates="listing")
 
+    __table_args__ = (
+        # Keyset pagination of the feed without a location (newest first)
+        Index('idx_listings_created_id', 'created_at', 'id'),
+        # Bounding-box filters in geometry space (map clusters and vector tiles)
+        Index('idx_listings_location_geometry', text('(location::geometry)'), postgresql_using='gist'),
+        # Incremental listing index refresh and cross-process change polling
+        Index('idx_listings_updated_at', 'updated_at'),
+    )
+
 
 class UserLike(Base):
     __tablename__ = "user_likes"
@@ -71,6 +89,7 @@ class UserLike(Base):
     liked = relationship("User", foreign_keys=[liked_id], back_populates="likes_received")
 
     __table_args__ = (
+        UniqueConstraint('liker_id', 'liked_id', name='user_likes_liker_id_liked_id_key'),
         CheckConstraint('liker_id != liked_id', name='check_no_self_like'),
     )
 
@@ -88,6 +107,9 @@ class UserMatch(Base):
     user2 = relationship("User", foreign_keys=[user2_id])
 
     __table_args__ = (
+        UniqueConstraint('user1_id', 'user2_id', name='user_matches_user1_id_user2_id_key'),
+        Index('idx_user_matches_user1', 'user1_id', 'created_at'),
+        Index('idx_user_matches_user2', 'user2_id', 'created_at'),
         CheckConstraint('user1_id != user2_id', name='check_no_self_match'),
     )
 
@@ -45,6 +45,7 @@ class UserResponse(UserBase):
 class UserProfileResponse(UserBase):
     id: UUID
     distance: Optional[float] = None  # Distance in km from current user
+    compatibility: Optional[float] = None  # 0..1, see match_scoring.score_candidates
     
     class Config:
         from_attributes = True
@@ -79,10 +80,30 @@ class ListingResponse(ListingBase):
     class Config:
         from_attributes = True
 
+class ListingCluster(BaseModel):
+    lat: float  # centroid
+    lon: float
+    count: int
+    price_min: int
+    price_median: float
+
+class InterestedUser(BaseModel):
+    """User whose search circle and budget contain a listing (push alert target)"""
+    id: UUID
+    telegram_id: int
+
 # Like and Match schemas
 class LikeUserRequest(BaseModel):
     user_id: UUID
 
+class BatchLikeRequest(BaseModel):
+    liked_ids: List[UUID] = Field(default_factory=list, max_length=500)
+    skipped_ids: List[UUID] = Field(default_factory=list, max_length=500)
+
+class BatchLikeResponse(BaseModel):
+    liked: List[UUID]  # newly liked users
+    matches: List[UUID]  # users the likes produced a match with
+
 class MatchResponse(BaseModel):
     id: UUID
     user: UserProfileResponse
@@ -91,6 +112,13 @@ class MatchResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# Session token issued by /api/auth/session
+class SessionTokenResponse(BaseModel):
+    token: str
+    token_type: str = "Bearer"
+    expires_at: datetime
+    user_id: UUID
+
 # Location schema
 class LocationPoint(BaseModel):
     lat: float = Field(ge=-90, le=90)
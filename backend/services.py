@@ -1,122 +1,320 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, or_, func, text
-from sqlalchemy.orm import selectinload
-from geoalchemy2.functions import ST_DWithin, ST_Distance, ST_GeogFromText, ST_AsText
-from models import User, Listing, UserLike, UserMatch, ListingLike
-from schemas import UserCreate, UserUpdate, ListingResponse, UserProfileResponse, MatchResponse
-from typing import List, Optional, Dict
+from sqlalchemy import select, update, union_all, and_, or_, func, text, cast, tuple_, Float
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect
+from geoalchemy2 import Geometry, Geography
+from geoalchemy2.functions import ST_DWithin, ST_Distance
+from geoalchemy2.shape import to_shape
+from models import User, Listing, UserMatch, ListingLike
+from schemas import UserBase, UserCreate, UserResponse, ListingResponse, ListingCluster, UserProfileResponse, MatchResponse, InterestedUser
+from typing import List, Optional, Dict, Tuple, NamedTuple
+import os
+import math
 import uuid
+import json
+import base64
+from itertools import chain
 from datetime import datetime
 from metro_stations import get_metro_station_info
+from listing_index import listing_index
+from cache import TTLCache
+from swipe_deck import swipe_decks, SWIPE_DECK_SIZE
+from geo_distance import as_coordinate_array
+from match_scoring import MATCH_SCORING_POOL, score_candidates, rank_candidates
+
+# Listing search response cache ("station feed": many users share a metro station)
+LISTING_CACHE_TTL = float(os.getenv("LISTING_CACHE_TTL", "60"))  # seconds
+LISTING_CACHE_SIZE = int(os.getenv("LISTING_CACHE_SIZE", "2048"))
+LISTING_CACHE_PRECISION = int(os.getenv("LISTING_CACHE_PRECISION", "4"))  # decimal places, ~11 m
+
+# Adaptive radius expansion for sparse areas (get_listings_for_user min_results)
+LISTING_MAX_SEARCH_RADIUS = int(os.getenv("LISTING_MAX_SEARCH_RADIUS", "20000"))  # meters
+LISTING_RADIUS_EXPANSION_FACTOR = 2
+LISTING_MAX_MIN_RESULTS = 200
+LISTING_MAX_RADIUS_LIMIT = 100000  # meters, upper bound accepted for max_radius
+
+listing_search_cache = TTLCache("listing_search", maxsize=LISTING_CACHE_SIZE, ttl=LISTING_CACHE_TTL)
+
+
+# Map clusters: tiles are 360/2^zoom degree squares split into CLUSTER_CELLS_PER_TILE^2 cells
+CLUSTER_CELLS_PER_TILE = 8
+CLUSTER_MAX_TILES = 64
+CLUSTER_CACHE_TTL = float(os.getenv("CLUSTER_CACHE_TTL", "300"))  # seconds
+
+listing_cluster_cache = TTLCache("listing_clusters", maxsize=4096, ttl=CLUSTER_CACHE_TTL)
+
+
+# Mapbox Vector Tiles of active listings
+MVT_MAX_ZOOM = 22
+MVT_CACHE_TTL = float(os.getenv("MVT_CACHE_TTL", "300"))  # seconds
+
+listing_tile_cache = TTLCache("listing_tiles", maxsize=4096, ttl=MVT_CACHE_TTL)
+
+# Listings are written by other processes (scripts, raw SQL) that bypass the
+# session hooks below: ListingService.poll_listing_changes compares this
+# fingerprint every LISTING_CHANGE_POLL_INTERVAL seconds. The cache TTLs
+# remain the upper bound on staleness.
+LISTING_CHANGE_POLL_INTERVAL = float(os.getenv("LISTING_CHANGE_POLL_INTERVAL", "5"))  # seconds
+_listing_fingerprint: Optional[tuple] = None
+
+
+# Only suggest potential matches whose price range overlaps the user's
+MATCH_REQUIRE_BUDGET_OVERLAP = os.getenv("MATCH_REQUIRE_BUDGET_OVERLAP", "false").lower() == "true"
+
+# Matched user ids per user, for the liked-listings permission gate
+MATCH_CACHE_TTL = float(os.getenv("MATCH_CACHE_TTL", "600"))  # seconds
+MATCH_CACHE_SIZE = int(os.getenv("MATCH_CACHE_SIZE", "10000"))
+
+user_match_cache = TTLCache("user_matches", maxsize=MATCH_CACHE_SIZE, ttl=MATCH_CACHE_TTL)
+
+
+def remember_match(user1_id: uuid.UUID, user2_id: uuid.UUID):
+    """Add a new match to the cached match sets of both users (if cached)"""
+    for user_id, other_id in ((user1_id, user2_id), (user2_id, user1_id)):
+        matched = user_match_cache.get(user_id)
+        if matched is not None:
+            user_match_cache.set(user_id, matched | {other_id})
+
+
+# Identity of authenticated users (telegram_id -> UserIdentity) shared across requests
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "60"))  # seconds
+IDENTITY_CACHE_SIZE = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+
+user_identity_cache = TTLCache("user_identity", maxsize=IDENTITY_CACHE_SIZE, ttl=IDENTITY_CACHE_TTL)
+
+
+class UserIdentity(NamedTuple):
+    """Fields of the authenticated user that endpoints need without loading the row"""
+    id: uuid.UUID
+    telegram_id: int
+    is_active: bool
+
+
+def invalidate_user_identity(telegram_id: int):
+    """Forget the cached identity after the user row was updated or deleted"""
+    user_identity_cache.pop(telegram_id)
+
+
+def invalidate_listing_caches():
+    """Drop cached listing search results, clusters and tiles after listings changed"""
+    listing_search_cache.clear()
+    listing_cluster_cache.clear()
+    listing_tile_cache.clear()
+
+
+# User fields that decide who appears in whose swipe deck
+SWIPE_DECK_FIELDS = ('metro_station', 'search_location', 'search_radius', 'price_min', 'price_max', 'is_active')
+
+
+@event.listens_for(Session, "after_flush")
+def _track_changes(session, flush_context):
+    if any(isinstance(obj, Listing) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["listings_changed"] = True
+    changed_users = {
+        obj.id for obj in chain(session.new, session.deleted) if isinstance(obj, User)
+    } | {
+        obj.id for obj in session.dirty
+        if isinstance(obj, User)
+        and any(inspect(obj).attrs[field].history.has_changes() for field in SWIPE_DECK_FIELDS)
+    }
+    if changed_users:
+        session.info.setdefault("users_changed", set()).update(changed_users)
+    changed_identities = {
+        obj.telegram_id for obj in chain(session.dirty, session.deleted) if isinstance(obj, User)
+    }
+    if changed_identities:
+        session.info.setdefault("identities_changed", set()).update(changed_identities)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes_on_commit(session):
+    if session.info.pop("listings_changed", False):
+        invalidate_listing_caches()
+    changed_users = session.info.pop("users_changed", None)
+    if changed_users:
+        swipe_decks.users_changed(changed_users)
+    for telegram_id in session.info.pop("identities_changed", ()):
+        invalidate_user_identity(telegram_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes_on_rollback(session):
+    session.info.pop("listings_changed", None)
+    session.info.pop("users_changed", None)
+    session.info.pop("identities_changed", None)
+
+
+def listing_coordinate_columns():
+    """Longitude/latitude of Listing.location as plain numbers for the select list"""
+    location = cast(Listing.location, Geometry)
+    return (
+        func.ST_X(location).label('lon'),
+        func.ST_Y(location).label('lat'),
+    )
+
+
+def point_coordinates(location) -> Tuple[float, float]:
+    """(lon, lat) of an already loaded geography point, without a database round trip"""
+    point = to_shape(location)
+    return point.x, point.y
+
+
+def listing_row_to_response(row, is_liked: bool = False) -> ListingResponse:
+    """Map a (Listing, lon, lat[, distance_km][, is_liked]) row to ListingResponse"""
+    mapping = row._mapping
+    listing = mapping[Listing]
+    return ListingResponse(
+        id=listing.id,
+        title=listing.title,
+        description=listing.description,
+        price=listing.price,
+        address=listing.address,
+        lat=mapping['lat'],
+        lon=mapping['lon'],
+        rooms=listing.rooms,
+        area=listing.area,
+        floor=listing.floor,
+        total_floors=listing.total_floors,
+        metro_station=listing.metro_station,
+        metro_distance=listing.metro_distance,
+        photos=listing.photos,
+        distance=mapping.get('distance_km'),
+        is_liked=bool(mapping.get('is_liked', is_liked)),
+        is_active=listing.is_active,
+        created_at=listing.created_at
+    )
+
+
+def encode_listing_cursor(listing: ListingResponse, radius: int = None, nearest: bool = False) -> str:
+    """Opaque keyset cursor pointing right after the given listing
+
+    radius (meters) and the ordering mode (KNN `<->` or spheroid distance)
+    are carried along so that later pages continue exactly like the first.
+    """
+    if listing.distance is not None:
+        payload = {"d": listing.distance, "id": str(listing.id)}
+    else:
+        payload = {"c": listing.created_at.isoformat(), "id": str(listing.id)}
+    if radius is not None:
+        payload["r"] = radius
+    if nearest:
+        payload["n"] = 1
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_listing_cursor(cursor: str) -> Dict:
+    """Decode a cursor produced by encode_listing_cursor, raises ValueError if malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        decoded = {"id": uuid.UUID(payload["id"])}
+        if "d" in payload:
+            decoded["distance"] = float(payload["d"])
+        else:
+            decoded["created_at"] = datetime.fromisoformat(payload["c"])
+        if "r" in payload:
+            decoded["radius"] = int(payload["r"])
+        if "n" in payload:
+            decoded["nearest"] = bool(payload["n"])
+        return decoded
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def encode_match_cursor(match: MatchResponse) -> str:
+    """Opaque keyset cursor pointing right after the given match"""
+    payload = {"c": match.created_at.isoformat(), "id": str(match.id)}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_match_cursor(cursor: str) -> Dict:
+    """Decode a cursor produced by encode_match_cursor, raises ValueError if malformed"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {"id": uuid.UUID(payload["id"]), "created_at": datetime.fromisoformat(payload["c"])}
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 
 class UserService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def create_or_update_user(self, telegram_id: int, user_data: UserCreate) -> User:
+    @staticmethod
+    def search_point(user_data: UserBase):
+        """Search location of a profile update: the metro station if given, else lat/lon
+
+        Coordinates are bound as parameters. Returns None when the update carries
+        no location; raises ValueError for an unknown metro station.
+        """
+        if user_data.metro_station:
+            station_info = get_metro_station_info(user_data.metro_station)
+            if not station_info:
+                raise ValueError(f"Unknown metro station: {user_data.metro_station}")
+            lat, lon = station_info["lat"], station_info["lon"]
+        elif getattr(user_data, 'lat', None) is not None and getattr(user_data, 'lon', None) is not None:
+            lat, lon = user_data.lat, user_data.lon
+        else:
+            return None
+        return cast(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326), Geography)
+
+    async def create_or_update_user(self, telegram_id: int, user_data: UserCreate) -> UserResponse:
         """Create or update user profile"""
         # Check if user exists
-        stmt = select(User).where(User.telegram_id == telegram_id)
-        result = await self.db.execute(stmt)
-        existing_user = result.scalar_one_or_none()
+        stmt = select(User.id).where(User.telegram_id == telegram_id)
+        existing_id = (await self.db.execute(stmt)).scalar_one_or_none()
 
-        if existing_user:
-            # Update existing user
-            for field, value in user_data.dict(exclude_unset=True, exclude={'telegram_id', 'lat', 'lon'}).items():
-                setattr(existing_user, field, value)
-            
-            # Update location based on metro station or lat/lon
-            if user_data.metro_station:
-                station_info = get_metro_station_info(user_data.metro_station)
-                if station_info:
-                    location_text = f'POINT({station_info["lon"]} {station_info["lat"]})'
-                    existing_user.search_location = func.ST_GeogFromText(location_text)
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.info(f"Updated user location to: {user_data.metro_station} -> {location_text}")
-            elif user_data.lat is not None and user_data.lon is not None:
-                location_text = f'POINT({user_data.lon} {user_data.lat})'
-                existing_user.search_location = func.ST_GeogFromText(location_text)
-            
-            existing_user.updated_at = datetime.utcnow()
-            await self.db.commit()
-            await self.db.refresh(existing_user)
-            return existing_user
-        else:
-            # Create new user
-            user_dict = user_data.dict(exclude={'lat', 'lon'})
-            new_user = User(**user_dict)
-            
-            # Set location based on metro station or lat/lon
-            if user_data.metro_station:
-                station_info = get_metro_station_info(user_data.metro_station)
-                if station_info:
-                    location_text = f'POINT({station_info["lon"]} {station_info["lat"]})'
-                    new_user.search_location = func.ST_GeogFromText(location_text)
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.info(f"Set new user location to: {user_data.metro_station} -> {location_text}")
-            elif user_data.lat is not None and user_data.lon is not None:
-                location_text = f'POINT({user_data.lon} {user_data.lat})'
-                new_user.search_location = func.ST_GeogFromText(location_text)
-            
-            self.db.add(new_user)
-            await self.db.commit()
-            await self.db.refresh(new_user)
-            return new_user
+        if existing_id:
+            return await self.update_user(existing_id, user_data)
 
-    async def update_user(self, user_id: uuid.UUID, user_data: UserUpdate) -> User:
-        """Update existing user"""
+        # Create new user
+        new_user = User(**user_data.dict(exclude={'lat', 'lon'}))
+        new_user.search_location = self.search_point(user_data)
+        self.db.add(new_user)
+        await self.db.commit()
+        await self.db.refresh(new_user)
+        return UserResponse.model_validate(new_user)
+
+    async def update_user(self, user_id: uuid.UUID, user_data: UserBase, skip_none: bool = False) -> UserResponse:
+        """Update the profile with a single UPDATE ... RETURNING and return the new row
+
+        search_radius below 1000 is taken as kilometers. skip_none leaves fields
+        sent as null unchanged. Raises ValueError for an unknown user or metro
+        station.
+        """
         import logging
         logger = logging.getLogger(__name__)
-        
-        logger.info(f"Updating user {user_id} with data: {user_data.dict(exclude_unset=True)}")
-        
-        stmt = select(User).where(User.id == user_id)
-        result = await self.db.execute(stmt)
-        user = result.scalar_one_or_none()
-        
-        if not user:
-            logger.error(f"User with id {user_id} not found")
+
+        values = {
+            field: value
+            for field, value in user_data.dict(exclude_unset=True, exclude={'telegram_id', 'lat', 'lon'}).items()
+            if value is not None or not skip_none
+        }
+        # Accept km if small values (< 1000)
+        if values.get('search_radius') is not None and values['search_radius'] < 1000:
+            values['search_radius'] *= 1000
+        search_point = self.search_point(user_data)
+        if search_point is not None:
+            values['search_location'] = search_point
+        values['updated_at'] = func.now()
+
+        logger.info(f"Updating user {user_id}: {sorted(values)}")
+        stmt = (
+            update(User)
+            .where(User.id == user_id)
+            .values(**values)
+            .returning(*(getattr(User, field) for field in UserResponse.model_fields))
+            .execution_options(synchronize_session=False)
+        )
+        row = (await self.db.execute(stmt)).one_or_none()
+        if row is None:
             raise ValueError("User not found")
-        
-        logger.info(f"Found user: {user.telegram_id}, {user.first_name}")
-        
-        # Update fields
-        for field, value in user_data.dict(exclude_unset=True, exclude={'lat', 'lon'}).items():
-            logger.info(f"Setting {field} to {value}")
-            setattr(user, field, value)
-        
-        # Update location based on metro station or lat/lon
-        if user_data.metro_station:
-            logger.info(f"Updating location based on metro station: {user_data.metro_station}")
-            station_info = get_metro_station_info(user_data.metro_station)
-            if station_info:
-                location_text = f'POINT({station_info["lon"]} {station_info["lat"]})'
-                user.search_location = func.ST_GeogFromText(location_text)
-                logger.info(f"Set location to: {location_text}")
-            else:
-                logger.warning(f"Metro station not found: {user_data.metro_station}")
-        elif user_data.lat is not None and user_data.lon is not None:
-            logger.info(f"Updating location based on lat/lon: {user_data.lat}, {user_data.lon}")
-            location_text = f'POINT({user_data.lon} {user_data.lat})'
-            user.search_location = func.ST_GeogFromText(location_text)
-            logger.info(f"Set location to: {location_text}")
-        
-        user.updated_at = datetime.utcnow()
-        
-        try:
-            logger.info("Committing changes to database")
-            await self.db.commit()
-            logger.info("Refreshing user data")
-            await self.db.refresh(user)
-            logger.info("User updated successfully")
-        except Exception as e:
-            logger.error(f"Error updating user: {str(e)}")
-            await self.db.rollback()
-            raise
-        
-        return user
+
+        # The bulk UPDATE bypasses the flush hooks: queue the cache updates for after_commit
+        if any(field in values for field in SWIPE_DECK_FIELDS):
+            self.db.info.setdefault("users_changed", set()).add(user_id)
+        self.db.info.setdefault("identities_changed", set()).add(row.telegram_id)
+        await self.db.commit()
+        return UserResponse.model_validate(row)
 
     async def get_user_by_telegram_id(self, telegram_id: int) -> Optional[User]:
         """Get user by telegram ID"""
@@ -125,52 +323,99 @@ class UserService:
         return result.scalar_one_or_none()
 
     async def get_user_by_id(self, user_id: uuid.UUID) -> Optional[User]:
-        """Get user by ID"""
-        stmt = select(User).where(User.id == user_id)
-        result = await self.db.execute(stmt)
-        return result.scalar_one_or_none()
+        """Get user by ID (no query if the session already loaded it)"""
+        return await self.db.get(User, user_id)
+
+    async def resolve_identity(self, telegram_id: int) -> Optional[UserIdentity]:
+        """Identity of the user with this telegram_id, from user_identity_cache when possible"""
+        identity = user_identity_cache.get(telegram_id)
+        if identity is None:
+            user = await self.get_user_by_telegram_id(telegram_id)
+            if user is None:
+                return None
+            identity = UserIdentity(user.id, user.telegram_id, user.is_active)
+            user_identity_cache.set(telegram_id, identity)
+        return identity
+
+    async def get_current_user(self, telegram_id: int) -> Optional[User]:
+        """Authenticated user's row, loaded once per request (session)
+
+        The row stays in the session's identity map, so services called later
+        in the same request (get_user_by_id, update_user) reuse it without
+        another SELECT.
+        """
+        identity = user_identity_cache.get(telegram_id)
+        if identity is not None:
+            user = await self.db.get(User, identity.id)
+            if user is not None:
+                return user
+            invalidate_user_identity(telegram_id)
+        
+        user = await self.get_user_by_telegram_id(telegram_id)
+        if user is not None:
+            user_identity_cache.set(telegram_id, UserIdentity(user.id, user.telegram_id, user.is_active))
+        return user
 
 
 class MatchingService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
-    async def get_potential_matches(self, user_id: uuid.UUID, limit: int = 10) -> List[UserProfileResponse]:
-        """Get potential matches based on overlapping search areas"""
-        # Get current user
-        current_user_stmt = select(User).where(User.id == user_id)
-        result = await self.db.execute(current_user_stmt)
-        current_user = result.scalar_one_or_none()
-        
-        if not current_user or not current_user.search_location:
-            return []
+    async def get_potential_matches(
+        self,
+        user_id: uuid.UUID,
+        limit: int = 10,
+        budget_overlap: bool = MATCH_REQUIRE_BUDGET_OVERLAP
+    ) -> List[UserProfileResponse]:
+        """Get potential matches based on overlapping search areas
 
-        # Get current user's location as text
-        location_stmt = select(func.ST_AsText(current_user.search_location))
-        loc_result = await self.db.execute(location_stmt)
-        location_text = loc_result.scalar()
-        
-        # Find users with overlapping search areas
-        # Users are potential matches if:
-        # 1. Their search area overlaps with current user's search area
-        # 2. Current user's search area overlaps with their search area
-        # 3. They haven't been liked by current user yet
-        # 4. They are active
-        
-        stmt = text("""
-            SELECT u.*, 
-                   ST_Distance(u.search_location, ST_GeogFromText(:current_location)) / 1000 as distance_km
-            FROM users u
-            WHERE u.id != :user_id 
+        Users are potential matches if either one's search area contains the
+        other's search point, i.e. distance <= GREATEST(their radius, my radius),
+        they are active and I haven't liked them yet. Since the per-row radius
+        can't drive the GiST index, candidates are first bounded by
+        ST_DWithin(..., GREATEST(my radius, max radius of all users)), which
+        can, and the exact per-row check runs on that candidate set only.
+        With budget_overlap the price ranges must overlap too (int4range &&),
+        checked by the same GiST index as the spatial prefilter.
+        Everything (including the current user's location) is one statement.
+        The MATCH_SCORING_POOL nearest candidates are then ranked by
+        compatibility (match_scoring.score_candidates) and the best `limit`
+        are returned.
+        """
+        budget_filter = "AND u.price_range && me.price_range" if budget_overlap else ""
+        stmt = text(f"""
+            WITH me AS (
+                SELECT search_location, COALESCE(search_radius, 1000) AS radius,
+                       price_min, price_max, price_range, age
+                FROM users
+                WHERE id = :user_id AND search_location IS NOT NULL
+            ),
+            bound AS (
+                SELECT GREATEST(me.radius, COALESCE(
+                    (SELECT MAX(search_radius) FROM users WHERE is_active = true), 0
+                )) AS radius
+                FROM me
+            )
+            SELECT u.id, u.username, u.first_name, u.last_name, u.photo_url, u.age, u.bio,
+                   u.price_min, u.price_max, u.metro_station, u.search_radius,
+                   ST_Distance(u.search_location, me.search_location) / 1000 AS distance_km,
+                   me.radius AS my_radius, me.price_min AS my_price_min,
+                   me.price_max AS my_price_max, me.age AS my_age
+            FROM me
+            CROSS JOIN bound
+            JOIN users u
+              ON ST_DWithin(u.search_location, me.search_location, bound.radius)
+              {budget_filter}
+            WHERE u.id != :user_id
               AND u.is_active = true
-              AND u.search_location IS NOT NULL
               AND u.search_radius IS NOT NULL
               AND (
-                  ST_DWithin(u.search_location, ST_GeogFromText(:current_location), u.search_radius)
-                  OR ST_DWithin(ST_GeogFromText(:current_location), u.search_location, :current_radius)
+                  ST_DWithin(u.search_location, me.search_location, u.search_radius)
+                  OR ST_DWithin(me.search_location, u.search_location, me.radius)
               )
-              AND u.id NOT IN (
-                  SELECT liked_id FROM user_likes WHERE liker_id = :user_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM user_likes ul
+                  WHERE ul.liker_id = :user_id AND ul.liked_id = u.id
               )
             ORDER BY distance_km
             LIMIT :limit
@@ -178,138 +423,253 @@ class MatchingService:
         
         result = await self.db.execute(stmt, {
             'user_id': user_id,
-            'current_location': location_text,
-            'current_radius': current_user.search_radius or 1000,
-            'limit': limit
+            'limit': max(limit, MATCH_SCORING_POOL)
         })
+        rows = result.fetchall()
+        if not rows:
+            return []
         
-        users_data = result.fetchall()
+        me = rows[0]
+        distances = as_coordinate_array([row.distance_km for row in rows]) * 1000
+        scores = score_candidates(
+            me.my_radius, me.my_price_min, me.my_price_max, me.my_age,
+            radii=as_coordinate_array([row.search_radius for row in rows]),
+            distances=distances,
+            price_mins=as_coordinate_array([row.price_min for row in rows]),
+            price_maxs=as_coordinate_array([row.price_max for row in rows]),
+            ages=as_coordinate_array([row.age for row in rows])
+        )
         
         # Convert to UserProfileResponse
-        matches = []
-        for row in users_data:
-            user_dict = dict(row._mapping)
-            distance = user_dict.pop('distance_km', None)
-            
-            match = UserProfileResponse(
-                id=user_dict['id'],
-                username=user_dict['username'],
-                first_name=user_dict['first_name'],
-                last_name=user_dict['last_name'],
-                photo_url=user_dict['photo_url'],
-                age=user_dict['age'],
-                bio=user_dict['bio'],
-                price_min=user_dict['price_min'],
-                price_max=user_dict['price_max'],
-                metro_station=user_dict['metro_station'],
-                search_radius=user_dict['search_radius'],
-                distance=distance
+        return [
+            UserProfileResponse(
+                id=row.id,
+                username=row.username,
+                first_name=row.first_name,
+                last_name=row.last_name,
+                photo_url=row.photo_url,
+                age=row.age,
+                bio=row.bio,
+                price_min=row.price_min,
+                price_max=row.price_max,
+                metro_station=row.metro_station,
+                search_radius=row.search_radius,
+                distance=row.distance_km,
+                compatibility=round(float(score), 4)
             )
-            matches.append(match)
+            for row, score in ((rows[i], scores[i]) for i in rank_candidates(scores, distances, limit))
+        ]
+
+    async def build_swipe_deck(self, user_id: uuid.UUID) -> List[UserProfileResponse]:
+        """Recompute and store the user's swipe deck (up to SWIPE_DECK_SIZE candidates)"""
+        stmt = select(
+            User.search_radius,
+            func.ST_X(cast(User.search_location, Geometry)).label('lon'),
+            func.ST_Y(cast(User.search_location, Geometry)).label('lat')
+        ).where(and_(User.id == user_id, User.search_location != None))
+        result = await self.db.execute(stmt)
+        center = result.first()
+        if center is None:
+            swipe_decks.drop(user_id)
+            return []
         
-        return matches
+        try:
+            entries = await self.get_potential_matches(user_id, limit=SWIPE_DECK_SIZE)
+        except Exception:
+            swipe_decks.mark_dirty([user_id])
+            raise
+        swipe_decks.store(user_id, entries, center.lat, center.lon, center.search_radius or 1000)
+        return entries
 
-    async def like_user(self, liker_id: uuid.UUID, liked_id: uuid.UUID) -> Dict[str, any]:
-        """Like another user, creates match if mutual"""
-        # Check if like already exists
-        existing_like_stmt = select(UserLike).where(
-            and_(UserLike.liker_id == liker_id, UserLike.liked_id == liked_id)
-        )
-        result = await self.db.execute(existing_like_stmt)
-        existing_like = result.scalar_one_or_none()
+    async def get_swipe_deck(self, user_id: uuid.UUID, limit: int = 10) -> List[UserProfileResponse]:
+        """Potential matches served from the precomputed deck
+
+        Built inline only when the user has no deck yet; stale decks are
+        rebuilt by refresh_swipe_decks.
+        """
+        entries = swipe_decks.peek(user_id, limit)
+        if entries is None:
+            await self.build_swipe_deck(user_id)
+            entries = swipe_decks.peek(user_id, limit) or []
+        return entries
+
+    async def refresh_swipe_decks(self, max_decks: int = 50) -> int:
+        """Propagate profile changes to affected decks, then rebuild up to max_decks of them"""
+        changed = swipe_decks.take_changed()
+        if changed:
+            # Decks showing a changed user hold a stale profile or no longer match it...
+            for user_id in changed:
+                swipe_decks.mark_dirty(swipe_decks.owners_containing(user_id))
+            # ...and decks around the user's (new) search circle may now include it
+            stmt = select(
+                User.search_radius,
+                func.ST_X(cast(User.search_location, Geometry)).label('lon'),
+                func.ST_Y(cast(User.search_location, Geometry)).label('lat')
+            ).where(and_(User.id.in_(changed), User.search_location != None))
+            result = await self.db.execute(stmt)
+            for row in result.all():
+                swipe_decks.mark_dirty(swipe_decks.owners_near(row.lat, row.lon, row.search_radius or 1000))
         
-        if existing_like:
-            return {"already_liked": True, "match": False}
+        owners = swipe_decks.take_dirty(max_decks)
+        for owner_id in owners:
+            await self.build_swipe_deck(owner_id)
+        return len(owners)
+
+    async def like_users(
+        self,
+        liker_id: uuid.UUID,
+        liked_ids: List[uuid.UUID],
+        skipped_ids: List[uuid.UUID] = ()
+    ) -> Dict[uuid.UUID, Dict[str, bool]]:
+        """Like many users at once, creating matches for mutual likes
+
+        One statement: like_users_and_match() inserts all likes in one
+        multi-row insert relying on UNIQUE(liker_id, liked_id), detects the
+        mutual likes and inserts the matches relying on UNIQUE(user1_id,
+        user2_id), under per-pair locks so concurrent mutual likes always
+        produce the match. Skipped users are only dropped from the swipe deck.
+        Returns {liked_id: {"liked": newly liked, "match": mutual}}; unknown
+        users are left out.
+        """
+        swipe_decks.discard(liker_id, [*liked_ids, *skipped_ids])
+        if not liked_ids:
+            return {}
         
-        # Create like
-        new_like = UserLike(liker_id=liker_id, liked_id=liked_id)
-        self.db.add(new_like)
+        stmt = text("""
+            SELECT target_id, liked, matched
+            FROM like_users_and_match(:liker_id, CAST(:liked_ids AS uuid[]))
+        """)
+        result = await self.db.execute(stmt, {'liker_id': liker_id, 'liked_ids': list(liked_ids)})
+        rows = result.all()
+        await self.db.commit()
         
-        # Check for mutual like and create match if found
-        mutual_like_stmt = select(UserLike).where(
-            and_(UserLike.liker_id == liked_id, UserLike.liked_id == liker_id)
-        )
-        result = await self.db.execute(mutual_like_stmt)
-        mutual_like = result.scalar_one_or_none()
-        
-        # If mutual like exists, create a match
-        if mutual_like:
-            # Check if match already exists
-            existing_match_stmt = select(UserMatch).where(
-                or_(
-                    and_(UserMatch.user1_id == liker_id, UserMatch.user2_id == liked_id),
-                    and_(UserMatch.user1_id == liked_id, UserMatch.user2_id == liker_id)
-                )
-            )
-            result = await self.db.execute(existing_match_stmt)
-            existing_match = result.scalar_one_or_none()
-            
-            if not existing_match:
-                # Create new match (ensure consistent ordering: smaller UUID first)
-                user1_id = min(liker_id, liked_id)
-                user2_id = max(liker_id, liked_id)
-                new_match = UserMatch(user1_id=user1_id, user2_id=user2_id)
-                self.db.add(new_match)
+        for row in rows:
+            if row.matched:
+                remember_match(liker_id, row.target_id)
         
-        await self.db.commit()
+        return {row.target_id: {"liked": row.liked, "match": row.matched} for row in rows}
+
+    async def like_user(self, liker_id: uuid.UUID, liked_id: uuid.UUID) -> Dict[str, any]:
+        """Like another user, creates match if mutual; ValueError if the user doesn't exist"""
+        outcome = (await self.like_users(liker_id, [liked_id])).get(liked_id)
+        if outcome is None:
+            raise ValueError("User not found")
+        
+        if not outcome["liked"]:
+            return {"already_liked": True, "match": False}
         
         return {
             "liked": True,
-            "match": bool(mutual_like),
-            "message": "It's a match! 🎉" if mutual_like else "Like sent!"
+            "match": outcome["match"],
+            "message": "It's a match! 🎉" if outcome["match"] else "Like sent!"
         }
 
-    async def get_user_matches(self, user_id: uuid.UUID) -> List[MatchResponse]:
-        """Get user's matches (mutual likes)"""
-        stmt = select(UserMatch).options(
-            selectinload(UserMatch.user1),
-            selectinload(UserMatch.user2)
-        ).where(
-            or_(UserMatch.user1_id == user_id, UserMatch.user2_id == user_id)
-        ).order_by(UserMatch.created_at.desc())
+    async def get_user_matches(
+        self,
+        user_id: uuid.UUID,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> List[MatchResponse]:
+        """Get user's matches (mutual likes), newest first
+
+        Each side of the pair is a seek on its (userN_id, created_at) index
+        limited to `limit` rows; the two branches are merged with UNION ALL
+        and only the page's other users are joined, with just the profile
+        columns. `cursor` comes from encode_match_cursor.
+        """
+        after = decode_match_cursor(cursor) if cursor else None
+        
+        def side(own_id, other_id):
+            query = select(
+                UserMatch.id.label('match_id'),
+                UserMatch.created_at.label('matched_at'),
+                other_id.label('other_id')
+            ).where(own_id == user_id)
+            if after is not None:
+                query = query.where(
+                    tuple_(UserMatch.created_at, UserMatch.id) < tuple_(after["created_at"], after["id"])
+                )
+            return query.order_by(UserMatch.created_at.desc(), UserMatch.id.desc()).limit(limit)
+        
+        page = union_all(
+            side(UserMatch.user1_id, UserMatch.user2_id),
+            side(UserMatch.user2_id, UserMatch.user1_id)
+        ).subquery('page')
+        stmt = select(
+            page.c.match_id,
+            page.c.matched_at,
+            User.id,
+            User.username,
+            User.first_name,
+            User.last_name,
+            User.photo_url,
+            User.age,
+            User.bio,
+            User.price_min,
+            User.price_max,
+            User.metro_station,
+            User.search_radius
+        ).join(
+            User, User.id == page.c.other_id
+        ).order_by(
+            page.c.matched_at.desc(), page.c.match_id.desc()
+        ).limit(limit)
         
         result = await self.db.execute(stmt)
-        matches = result.scalars().all()
         
-        match_responses = []
-        for match in matches:
-            # Get the other user
-            other_user = match.user2 if match.user1_id == user_id else match.user1
-            
-            user_profile = UserProfileResponse(
-                id=other_user.id,
-                username=other_user.username,
-                first_name=other_user.first_name,
-                last_name=other_user.last_name,
-                photo_url=other_user.photo_url,
-                age=other_user.age,
-                bio=other_user.bio,
-                price_min=other_user.price_min,
-                price_max=other_user.price_max,
-                metro_station=other_user.metro_station,
-                search_radius=other_user.search_radius
+        return [
+            MatchResponse(
+                id=row.match_id,
+                user=UserProfileResponse(
+                    id=row.id,
+                    username=row.username,
+                    first_name=row.first_name,
+                    last_name=row.last_name,
+                    photo_url=row.photo_url,
+                    age=row.age,
+                    bio=row.bio,
+                    price_min=row.price_min,
+                    price_max=row.price_max,
+                    metro_station=row.metro_station,
+                    search_radius=row.search_radius
+                ),
+                created_at=row.matched_at
             )
-            
-            match_response = MatchResponse(
-                id=match.id,
-                user=user_profile,
-                created_at=match.created_at
+            for row in result
+        ]
+
+    async def get_matched_user_ids(self, user_id: uuid.UUID) -> frozenset:
+        """Ids of all users matched with user_id (cached per user)"""
+        matched = user_match_cache.get(user_id)
+        if matched is None:
+            stmt = select(UserMatch.user2_id).where(UserMatch.user1_id == user_id).union_all(
+                select(UserMatch.user1_id).where(UserMatch.user2_id == user_id)
             )
-            match_responses.append(match_response)
-        
-        return match_responses
+            result = await self.db.execute(stmt)
+            matched = frozenset(result.scalars().all())
+            user_match_cache.set(user_id, matched)
+        return matched
 
     async def are_users_matched(self, user1_id: uuid.UUID, user2_id: uuid.UUID) -> bool:
-        """Check if two users are matched"""
-        stmt = select(UserMatch).where(
-            or_(
-                and_(UserMatch.user1_id == user1_id, UserMatch.user2_id == user2_id),
-                and_(UserMatch.user1_id == user2_id, UserMatch.user2_id == user1_id)
-            )
+        """Check if two users are matched
+
+        Answered from the cached match set of user1; a negative answer is
+        confirmed with a point lookup since the match may have been created
+        by another worker process.
+        """
+        if user2_id in await self.get_matched_user_ids(user1_id):
+            return True
+        
+        stmt = select(UserMatch.id).where(
+            UserMatch.user1_id == func.least(user1_id, user2_id),
+            UserMatch.user2_id == func.greatest(user1_id, user2_id)
         )
         result = await self.db.execute(stmt)
-        match = result.scalar_one_or_none()
-        return bool(match)
+        if result.scalar_one_or_none() is None:
+            return False
+        
+        remember_match(user1_id, user2_id)
+        return True
 
 
 class ListingService:
@@ -320,130 +680,473 @@ class ListingService:
         self, 
         lat: float = None, 
         lon: float = None, 
-        radius: int = 1000,
+        radius: Optional[int] = 1000,
         price_min: int = None,
         price_max: int = None,
-        limit: int = 50
+        limit: int = 50,
+        cursor: str = None,
+        nearest: bool = False,
+        user_id: uuid.UUID = None
     ) -> List[ListingResponse]:
-        """Search listings based on location and filters"""
+        """Search listings based on location and filters (single query)
+
+        Pages are keyset-paginated: pass the cursor of the last listing of the
+        previous page (see encode_listing_cursor) to continue after it.
+        Coordinates are quantized to LISTING_CACHE_PRECISION so that nearby
+        searches share one cached response.
+
+        With nearest=True results are ordered by the index-assisted KNN
+        operator (<->), so "nearest N" walks the GiST index and stops after
+        `limit` rows; radius may then be None for an unbounded search.
+
+        With user_id, is_liked is set for that user: inside the search query
+        itself on a cache miss, or by one batched lookup for cached results.
+        """
+        after = decode_listing_cursor(cursor) if cursor else None
+        if lat is not None and lon is not None:
+            lat, lon = round(lat, LISTING_CACHE_PRECISION), round(lon, LISTING_CACHE_PRECISION)
+        if radius is None and not nearest:
+            radius = 1000
+        
+        cache_key = (lat, lon, radius, price_min, price_max, limit, cursor, nearest)
+        listings = listing_search_cache.get(cache_key)
+        annotated = False
+        if listings is None:
+            listings, annotated = await self._search_listings(
+                lat, lon, radius, price_min, price_max, limit, after, nearest, user_id
+            )
+            # The cache is shared by all users, so it stores results without likes
+            listing_search_cache.set(cache_key, [
+                listing.model_copy(update={"is_liked": False}) if listing.is_liked else listing
+                for listing in listings
+            ])
+        if user_id is not None and not annotated:
+            return await self._annotate_liked(listings, user_id)
+        return list(listings)
+
+    async def _annotate_liked(self, listings: List[ListingResponse], user_id: uuid.UUID) -> List[ListingResponse]:
+        """Set is_liked on already fetched listings with one batched lookup"""
+        if not listings:
+            return []
+        stmt = select(ListingLike.listing_id).where(
+            and_(
+                ListingLike.user_id == user_id,
+                ListingLike.listing_id.in_([listing.id for listing in listings])
+            )
+        )
+        result = await self.db.execute(stmt)
+        liked_ids = set(result.scalars().all())
+        return [
+            listing.model_copy(update={"is_liked": True}) if listing.id in liked_ids else listing
+            for listing in listings
+        ]
+
+    async def _search_listings(
+        self,
+        lat: Optional[float],
+        lon: Optional[float],
+        radius: Optional[int],
+        price_min: Optional[int],
+        price_max: Optional[int],
+        limit: int,
+        after: Optional[Dict],
+        nearest: bool = False,
+        user_id: Optional[uuid.UUID] = None,
+        match_budgets_of: Optional[uuid.UUID] = None
+    ) -> Tuple[List[ListingResponse], bool]:
+        """Uncached search_listings; also returns whether is_liked was annotated
+
+        With match_budgets_of only listings priced within the budget of any
+        match of that user are returned.
+        """
+        has_location = lat is not None and lon is not None
+        if has_location and after is not None and "distance" not in after:
+            raise ValueError("Invalid cursor: expected a distance cursor")
         
-        query = select(Listing).where(Listing.is_active == True)
+        # Serve radius queries from the in-process snapshot while it is fresh
+        if has_location and radius is not None and match_budgets_of is None and listing_index.is_fresh:
+            return listing_index.query(
+                lat, lon, radius,
+                price_min=price_min, price_max=price_max, limit=limit,
+                after=(after["distance"], after["id"]) if after else None
+            ), False
+        
+        query = select(Listing, *listing_coordinate_columns()).where(Listing.is_active == True)
         
         # Location filter
-        if lat is not None and lon is not None:
+        if has_location:
             search_point = func.ST_GeogFromText(f'POINT({lon} {lat})')
-            query = query.where(
-                ST_DWithin(Listing.location, search_point, radius)
-            ).add_columns(
-                (ST_Distance(Listing.location, search_point) / 1000).label('distance_km')
-            ).order_by(
-                ST_Distance(Listing.location, search_point)
-            )
+            if nearest:
+                # ORDER BY must be the bare `location <-> point` for a KNN index scan;
+                # the same value is reported as distance so the cursor stays consistent
+                knn_distance = Listing.location.op('<->', return_type=Float)(search_point)
+                distance_km = knn_distance / 1000
+                query = query.order_by(knn_distance, Listing.id)
+            else:
+                distance_km = ST_Distance(Listing.location, search_point) / 1000
+                query = query.order_by(distance_km, Listing.id)
+            if radius is not None:
+                query = query.where(ST_DWithin(Listing.location, search_point, radius))
+            query = query.add_columns(distance_km.label('distance_km'))
+            if after is not None:
+                query = query.where(
+                    tuple_(distance_km, Listing.id) > tuple_(after["distance"], after["id"])
+                )
+        else:
+            # Newest first, seeking on (created_at, id)
+            query = query.order_by(Listing.created_at.desc(), Listing.id.desc())
+            if after is not None:
+                if "created_at" not in after:
+                    raise ValueError("Invalid cursor: expected a created_at cursor")
+                query = query.where(
+                    tuple_(Listing.created_at, Listing.id) < tuple_(after["created_at"], after["id"])
+                )
         
         # Price filters
         if price_min is not None:
             query = query.where(Listing.price >= price_min)
         if price_max is not None:
             query = query.where(Listing.price <= price_max)
+        if match_budgets_of is not None:
+            # Union (multirange) of the matches' price ranges; matches without any budget are skipped
+            matched_ids = select(UserMatch.user2_id).where(UserMatch.user1_id == match_budgets_of).union_all(
+                select(UserMatch.user1_id).where(UserMatch.user2_id == match_budgets_of)
+            )
+            budgets = select(func.range_agg(User.price_range)).where(
+                User.id.in_(matched_ids),
+                or_(User.price_min != None, User.price_max != None)
+            ).scalar_subquery()
+            query = query.where(Listing.price.op('<@')(budgets))
+        
+        if user_id is not None:
+            # EXISTS probe per returned row, served by the listing_likes user_id index
+            is_liked = select(ListingLike.id).where(
+                and_(ListingLike.user_id == user_id, ListingLike.listing_id == Listing.id)
+            ).exists()
+            query = query.add_columns(is_liked.label('is_liked'))
         
         query = query.limit(limit)
         
         result = await self.db.execute(query)
-        
-        listings = []
-        if lat is not None and lon is not None:
-            # When location filter is applied, we get tuples with distance
-            rows = result.fetchall()
-            for row in rows:
-                if isinstance(row, tuple) and len(row) > 1:
-                    listing, distance = row[0], row[1]
-                else:
-                    listing = row[0]
-                    distance = None
-                
-                # Extract coordinates  
-                location_stmt = select(func.ST_AsText(listing.location))
-                loc_result = await self.db.execute(location_stmt)
-                location_text = loc_result.scalar()
-                
-                # Parse POINT(lon lat) format
-                coords = location_text.replace('POINT(', '').replace(')', '').split()
-                listing_lon, listing_lat = float(coords[0]), float(coords[1])
-                
-                listing_response = ListingResponse(
-                    id=listing.id,
-                    title=listing.title,
-                    description=listing.description,
-                    price=listing.price,
-                    address=listing.address,
-                    lat=listing_lat,
-                    lon=listing_lon,
-                    rooms=listing.rooms,
-                    area=listing.area,
-                    floor=listing.floor,
-                    total_floors=listing.total_floors,
-                    metro_station=listing.metro_station,
-                    metro_distance=listing.metro_distance,
-                    photos=listing.photos,
-                    distance=distance,
-                    is_active=listing.is_active,
-                    created_at=listing.created_at
-                )
-                listings.append(listing_response)
-        else:
-            # Without location filter, we get just the listing objects
-            result_listings = result.scalars().all()
-            for listing in result_listings:
-                # Extract coordinates
-                location_stmt = select(func.ST_AsText(listing.location))
-                loc_result = await self.db.execute(location_stmt)
-                location_text = loc_result.scalar()
-                
-                # Parse POINT(lon lat) format
-                coords = location_text.replace('POINT(', '').replace(')', '').split()
-                listing_lon, listing_lat = float(coords[0]), float(coords[1])
-                
-                listing_response = ListingResponse(
-                    id=listing.id,
-                    title=listing.title,
-                    description=listing.description,
-                    price=listing.price,
-                    address=listing.address,
-                    lat=listing_lat,
-                    lon=listing_lon,
-                    rooms=listing.rooms,
-                    area=listing.area,
-                    floor=listing.floor,
-                    total_floors=listing.total_floors,
-                    metro_station=listing.metro_station,
-                    metro_distance=listing.metro_distance,
-                    photos=listing.photos,
-                    is_active=listing.is_active,
-                    created_at=listing.created_at
-                )
-                listings.append(listing_response)
-        
-        return listings
+        return [listing_row_to_response(row) for row in result.all()], user_id is not None
+
+    async def get_listings_for_user(
+        self,
+        user: User,
+        limit: int = 50,
+        cursor: str = None,
+        radius: int = None,
+        min_results: int = None,
+        max_radius: int = None
+    ) -> Tuple[List[ListingResponse], int, bool]:
+        """Get listings based on user's search criteria
 
-    async def get_listings_for_user(self, user: User) -> List[ListingResponse]:
-        """Get listings based on user's search criteria"""
+        Returns the listings, the effective radius in meters and whether they
+        are in KNN order (for encode_listing_cursor). With min_results the
+        radius (user's search_radius unless overridden) is doubled until it
+        holds at least min_results listings or reaches max_radius; this is
+        resolved from a single KNN query bounded by max_radius. Later pages
+        continue with the radius and ordering stored in the cursor.
+        """
+        if min_results is not None and not 1 <= min_results <= LISTING_MAX_MIN_RESULTS:
+            raise ValueError(f"min_results must be between 1 and {LISTING_MAX_MIN_RESULTS}")
+        if radius is not None and not 1 <= radius <= LISTING_MAX_RADIUS_LIMIT:
+            raise ValueError(f"radius must be between 1 and {LISTING_MAX_RADIUS_LIMIT}")
+        base_radius = min(radius or user.search_radius or 1000, LISTING_MAX_RADIUS_LIMIT)
+        nearest = bool(min_results)
+        if cursor:
+            after = decode_listing_cursor(cursor)
+            base_radius = after.get("radius", base_radius)
+            if not 1 <= base_radius <= LISTING_MAX_RADIUS_LIMIT:
+                raise ValueError("Invalid cursor: radius out of range")
+            nearest = after.get("nearest", nearest)
         if not user.search_location:
-            return []
+            return [], base_radius, nearest
+        
+        user_lon, user_lat = point_coordinates(user.search_location)
         
-        # Extract coordinates from user location
-        location_stmt = select(func.ST_AsText(user.search_location))
-        result = await self.db.execute(location_stmt)
-        location_text = result.scalar()
-        coords = location_text.replace('POINT(', '').replace(')', '').split()
-        user_lon, user_lat = float(coords[0]), float(coords[1])
+        if not min_results or cursor:
+            listings = await self.search_listings(
+                lat=user_lat,
+                lon=user_lon,
+                radius=base_radius,
+                price_min=user.price_min,
+                price_max=user.price_max,
+                limit=limit,
+                cursor=cursor,
+                user_id=user.id,
+                # Continue adaptive pages in KNN order, like their first page
+                nearest=nearest
+            )
+            return listings, base_radius, nearest
         
-        return await self.search_listings(
+        max_radius = max(min(max_radius or LISTING_MAX_SEARCH_RADIUS, LISTING_MAX_RADIUS_LIMIT), base_radius)
+        nearest = await self.search_listings(
             lat=user_lat,
             lon=user_lon,
-            radius=user.search_radius or 1000,
+            radius=max_radius,
             price_min=user.price_min,
-            price_max=user.price_max
+            price_max=user.price_max,
+            limit=max(limit, min_results),
+            nearest=True,
+            user_id=user.id
         )
+        
+        # Smallest expansion step that covers the min_results-th nearest listing
+        needed = nearest[min_results - 1].distance * 1000 if len(nearest) >= min_results else max_radius
+        effective_radius = base_radius
+        while effective_radius < needed and effective_radius < max_radius:
+            effective_radius = min(effective_radius * LISTING_RADIUS_EXPANSION_FACTOR, max_radius)
+        
+        listings = [listing for listing in nearest if listing.distance * 1000 <= effective_radius]
+        return listings[:limit], effective_radius, True
+
+    async def get_listings_within_match_budgets(
+        self,
+        user: User,
+        limit: int = 50,
+        cursor: str = None
+    ) -> List[ListingResponse]:
+        """Listings in the user's search area priced within any of their matches' budgets
+
+        Nearest first, keyset-paginated like search_listings. Not cached
+        since the result depends on the user's matches.
+        """
+        if not user.search_location:
+            return []
+        
+        user_lon, user_lat = point_coordinates(user.search_location)
+        after = decode_listing_cursor(cursor) if cursor else None
+        listings, _ = await self._search_listings(
+            user_lat, user_lon, user.search_radius or 1000, None, None, limit, after,
+            user_id=user.id, match_budgets_of=user.id
+        )
+        return listings
+
+    async def get_listing_clusters(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        zoom: int,
+        price_min: int = None,
+        price_max: int = None
+    ) -> List[ListingCluster]:
+        """Grid-aggregated clusters of active listings inside a map viewport
+
+        The viewport is covered by zoom-level tiles; each tile's clusters are
+        cached per (tile, zoom, price filter) and missing tiles are computed
+        together in one GROUP BY query over the GiST-indexed bounding box
+        (geometry, clamped to the valid lon/lat range).
+        """
+        tile_size = 360.0 / (2 ** zoom)
+        cell_size = tile_size / CLUSTER_CELLS_PER_TILE
+        tile_x_range = range(math.floor(min_lon / tile_size), math.floor(max_lon / tile_size) + 1)
+        tile_y_range = range(math.floor(min_lat / tile_size), math.floor(max_lat / tile_size) + 1)
+        if len(tile_x_range) * len(tile_y_range) > CLUSTER_MAX_TILES:
+            raise ValueError("Viewport is too large for this zoom level")
+        
+        clusters_by_tile = {}
+        missing = []
+        for tile_x in tile_x_range:
+            for tile_y in tile_y_range:
+                cached = listing_cluster_cache.get((zoom, tile_x, tile_y, price_min, price_max))
+                if cached is None:
+                    missing.append((tile_x, tile_y))
+                else:
+                    clusters_by_tile[(tile_x, tile_y)] = cached
+        
+        if missing:
+            fetched = {tile: [] for tile in missing}
+            # Low-zoom tiles reach past the poles and the antimeridian: clamp the
+            # envelope and compare in geometry space (idx_listings_location_geometry),
+            # where a world-wide box is valid
+            envelope = func.ST_MakeEnvelope(
+                max(min(x for x, _ in missing) * tile_size, -180.0),
+                max(min(y for _, y in missing) * tile_size, -90.0),
+                min((max(x for x, _ in missing) + 1) * tile_size, 180.0),
+                min((max(y for _, y in missing) + 1) * tile_size, 90.0),
+                4326
+            )
+            # geometry(location), not CAST(... AS geometry(GEOMETRY,-1)): the typmod
+            # coercion would no longer match the index expression
+            location = func.geometry(Listing.location)
+            cell_x = func.floor(func.ST_X(location) / cell_size).label('cell_x')
+            cell_y = func.floor(func.ST_Y(location) / cell_size).label('cell_y')
+            query = select(
+                cell_x,
+                cell_y,
+                func.count().label('count'),
+                func.avg(func.ST_Y(location)).label('lat'),
+                func.avg(func.ST_X(location)).label('lon'),
+                func.min(Listing.price).label('price_min'),
+                func.percentile_cont(0.5).within_group(Listing.price).label('price_median')
+            ).where(
+                Listing.is_active == True,
+                location.op('&&')(envelope)
+            ).group_by(cell_x, cell_y)
+            if price_min is not None:
+                query = query.where(Listing.price >= price_min)
+            if price_max is not None:
+                query = query.where(Listing.price <= price_max)
+            
+            result = await self.db.execute(query)
+            for row in result.all():
+                tile = (int(row.cell_x) // CLUSTER_CELLS_PER_TILE, int(row.cell_y) // CLUSTER_CELLS_PER_TILE)
+                if tile in fetched:
+                    fetched[tile].append(ListingCluster(
+                        lat=row.lat,
+                        lon=row.lon,
+                        count=row.count,
+                        price_min=row.price_min,
+                        price_median=row.price_median
+                    ))
+            for (tile_x, tile_y), clusters in fetched.items():
+                listing_cluster_cache.set((zoom, tile_x, tile_y, price_min, price_max), clusters)
+            clusters_by_tile.update(fetched)
+        
+        return [
+            cluster
+            for clusters in clusters_by_tile.values()
+            for cluster in clusters
+            if min_lat <= cluster.lat <= max_lat and min_lon <= cluster.lon <= max_lon
+        ]
+
+    async def get_listing_tile(self, z: int, x: int, y: int) -> bytes:
+        """Mapbox Vector Tile (layer "listings", attributes id/price/rooms) for tile z/x/y"""
+        if not 0 <= z <= MVT_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError("Tile coordinates out of range")
+        
+        tile = listing_tile_cache.get((z, x, y))
+        if tile is not None:
+            return tile
+        
+        stmt = text("""
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+            ),
+            mvtgeom AS (
+                SELECT ST_AsMVTGeom(ST_Transform(l.location::geometry, 3857), bounds.geom) AS geom,
+                       l.id::text AS id,
+                       l.price,
+                       l.rooms
+                FROM listings l, bounds
+                WHERE l.is_active = true
+                  -- Geometry space (idx_listings_location_geometry): as geography,
+                  -- world-wide low-zoom envelopes collapse or are rejected
+                  AND l.location::geometry && ST_Transform(bounds.geom, 4326)
+            )
+            SELECT ST_AsMVT(mvtgeom.*, 'listings') FROM mvtgeom
+        """)
+        result = await self.db.execute(stmt, {'z': z, 'x': x, 'y': y})
+        tile = bytes(result.scalar() or b"")
+        listing_tile_cache.set((z, x, y), tile)
+        return tile
+
+    async def load_listing_index(self) -> int:
+        """Load all active listings into the in-process spatial index"""
+        stmt = select(Listing, *listing_coordinate_columns()).where(Listing.is_active == True)
+        result = await self.db.execute(stmt)
+        rows = result.all()
+        synced_through = max(
+            (row._mapping[Listing].updated_at for row in rows if row._mapping[Listing].updated_at),
+            default=None
+        )
+        listing_index.build((listing_row_to_response(row) for row in rows), synced_through)
+        return len(listing_index)
+
+    async def refresh_listing_index(self) -> int:
+        """Apply listings changed since the last refresh to the spatial index
+
+        Changes are found by updated_at (bumped by trigger_listing_updated_at);
+        deleted rows are not, so the snapshot is reloaded whenever its size no
+        longer matches the number of active listings.
+        """
+        if not listing_index.loaded or listing_index.synced_through is None:
+            return await self.load_listing_index()
+        
+        # >= rather than >: re-applying a row is idempotent, missing one is not
+        stmt = select(Listing, *listing_coordinate_columns()).where(
+            Listing.updated_at >= listing_index.synced_through
+        )
+        result = await self.db.execute(stmt)
+        rows = result.all()
+        previous_sync = synced_through = listing_index.synced_through
+        changed = 0
+        for row in rows:
+            listing_index.upsert(listing_row_to_response(row))
+            updated_at = row._mapping[Listing].updated_at
+            if updated_at and updated_at > previous_sync:
+                changed += 1
+                synced_through = max(synced_through, updated_at)
+
+        # Hard deletes leave no updated_at trace: reload when the counts disagree
+        active_count = (await self.db.execute(
+            select(func.count()).select_from(Listing).where(Listing.is_active == True)
+        )).scalar_one()
+        if active_count != len(listing_index):
+            await self.load_listing_index()
+            invalidate_listing_caches()
+            return max(changed, 1)
+
+        listing_index.touch(synced_through)
+        if changed:
+            # Also catches writes made outside this process (e.g. generate_listings.py)
+            invalidate_listing_caches()
+        return changed
+
+    async def poll_listing_changes(self) -> bool:
+        """Invalidate the listing caches if the listings table changed since the last poll
+
+        count(*) catches inserts and deletes, max(updated_at) catches updates
+        (bumped by trigger_listing_updated_at), wherever they were made.
+        """
+        global _listing_fingerprint
+        row = (await self.db.execute(
+            select(func.count(), func.max(Listing.updated_at)).select_from(Listing)
+        )).one()
+        fingerprint = tuple(row)
+        changed = _listing_fingerprint is not None and fingerprint != _listing_fingerprint
+        _listing_fingerprint = fingerprint
+        if changed:
+            invalidate_listing_caches()
+        return changed
+
+    async def get_interested_users(self, listing_ids: List[uuid.UUID]) -> Dict[uuid.UUID, List[InterestedUser]]:
+        """Active users whose search circle and price range contain each listing
+
+        One spatial join for the whole batch: the GiST index on the stored
+        users.search_area buffer finds the candidate circles, ST_DWithin
+        against the exact radius confirms them.
+        """
+        if not listing_ids:
+            return {}
+        
+        stmt = select(
+            Listing.id.label('listing_id'),
+            User.id,
+            User.telegram_id
+        ).join(
+            User, and_(
+                User.search_area.op('&&')(Listing.location),
+                ST_DWithin(User.search_location, Listing.location, User.search_radius)
+            )
+        ).where(
+            Listing.id.in_(listing_ids),
+            User.is_active == True,
+            User.price_range.op('@>')(Listing.price)
+        )
+        
+        result = await self.db.execute(stmt)
+        interested: Dict[uuid.UUID, List[InterestedUser]] = {listing_id: [] for listing_id in listing_ids}
+        for row in result:
+            interested[row.listing_id].append(InterestedUser(id=row.id, telegram_id=row.telegram_id))
+        return interested
+
+    async def get_users_interested_in_listing(self, listing_id: uuid.UUID) -> List[InterestedUser]:
+        """Active users whose search circle and price range contain the listing"""
+        return (await self.get_interested_users([listing_id]))[listing_id]
 
     async def like_listing(self, user_id: uuid.UUID, listing_id: uuid.UUID) -> Dict[str, any]:
         """Like a listing"""
@@ -465,43 +1168,10 @@ class ListingService:
         return {"liked": True}
 
     async def get_user_liked_listings(self, user_id: uuid.UUID) -> List[ListingResponse]:
-        """Get user's liked listings"""
-        stmt = select(Listing).join(ListingLike).where(
+        """Get user's liked listings (single query)"""
+        stmt = select(Listing, *listing_coordinate_columns()).join(ListingLike).where(
             and_(ListingLike.user_id == user_id, Listing.is_active == True)
         ).order_by(ListingLike.created_at.desc())
         
         result = await self.db.execute(stmt)
-        listings = result.scalars().all()
-        
-        listing_responses = []
-        for listing in listings:
-            # Extract coordinates
-            location_stmt = select(func.ST_AsText(listing.location))
-            loc_result = await self.db.execute(location_stmt)
-            location_text = loc_result.scalar()
-            
-            coords = location_text.replace('POINT(', '').replace(')', '').split()
-            listing_lon, listing_lat = float(coords[0]), float(coords[1])
-            
-            listing_response = ListingResponse(
-                id=listing.id,
-                title=listing.title,
-                description=listing.description,
-                price=listing.price,
-                address=listing.address,
-                lat=listing_lat,
-                lon=listing_lon,
-                rooms=listing.rooms,
-                area=listing.area,
-                floor=listing.floor,
-                total_floors=listing.total_floors,
-                metro_station=listing.metro_station,
-                metro_distance=listing.metro_distance,
-                photos=listing.photos,
-                is_liked=True,
-                is_active=listing.is_active,
-                created_at=listing.created_at
-            )
-            listing_responses.append(listing_response)
-        
-        return listing_responses
\ No newline at end of file
+        return [listing_row_to_response(row, is_liked=True) for row in result.all()]
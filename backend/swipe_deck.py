@@ -0,0 +1,205 @@
+"""
+Precomputed per-user swipe decks (potential-match queues)
+
+A deck is the ordered list of candidates MatchingService.get_potential_matches
+returned for its owner, plus the owner's search circle. Reads peek at the
+front of the deque and likes/skips discard entries lazily, so serving the
+Matching screen does not touch the spatial query. Decks are rebuilt by a
+background worker when they are marked dirty (the owner or a nearby user
+changed location, radius or budget) or when they get old; until then the
+previous deck keeps being served. Decks not read for the TTL are dropped
+instead, and the store keeps at most SWIPE_DECK_MAX_DECKS (least recently
+read evicted first).
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict, defaultdict, deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+from geo_distance import as_coordinate_array, intersecting_search_areas
+from schemas import UserProfileResponse
+
+SWIPE_DECK_SIZE = int(os.getenv("SWIPE_DECK_SIZE", "200"))
+SWIPE_DECK_TTL = float(os.getenv("SWIPE_DECK_TTL", "600"))  # seconds
+SWIPE_DECK_REFRESH_INTERVAL = float(os.getenv("SWIPE_DECK_REFRESH_INTERVAL", "5"))  # seconds
+SWIPE_DECK_MAX_DECKS = int(os.getenv("SWIPE_DECK_MAX_DECKS", "10000"))
+# Decks older than this share of the TTL are rebuilt ahead of time by the worker
+SWIPE_DECK_REBUILD_AGE = 0.8
+
+
+class _Deck:
+    __slots__ = ("entries", "removed", "lat", "lon", "radius", "built_at", "read_at", "full")
+
+    def __init__(
+        self,
+        entries: List[UserProfileResponse],
+        lat: float,
+        lon: float,
+        radius: int,
+        full: bool,
+        read_at: Optional[float] = None
+    ):
+        self.entries: Deque[UserProfileResponse] = deque(entries)
+        self.removed: Set[uuid.UUID] = set()
+        self.lat = lat
+        self.lon = lon
+        self.radius = radius
+        self.built_at = time.monotonic()
+        self.read_at = self.built_at if read_at is None else read_at
+        self.full = full
+
+
+class SwipeDeckStore:
+    """In-process decks of all users who opened the Matching screen recently"""
+
+    def __init__(self, size: int = SWIPE_DECK_SIZE, ttl: float = SWIPE_DECK_TTL, max_decks: int = SWIPE_DECK_MAX_DECKS):
+        self.size = size
+        self.ttl = ttl
+        self.max_decks = max_decks
+        self._decks: "OrderedDict[uuid.UUID, _Deck]" = OrderedDict()  # least recently read first
+        self._containing: Dict[uuid.UUID, Set[uuid.UUID]] = defaultdict(set)  # candidate -> deck owners
+        self._dirty: Set[uuid.UUID] = set()
+        self._changed: Set[uuid.UUID] = set()
+
+    def __len__(self) -> int:
+        return len(self._decks)
+
+    def store(self, owner_id: uuid.UUID, entries: List[UserProfileResponse], lat: float, lon: float, radius: int):
+        previous = self._decks.get(owner_id)
+        if previous is not None:
+            self._unindex(owner_id, previous)
+        # Replaced in place, and a background rebuild is not a read: the deck
+        # keeps its read_at and LRU position
+        self._decks[owner_id] = _Deck(
+            entries, lat, lon, radius,
+            full=len(entries) >= self.size,
+            read_at=previous.read_at if previous is not None else None
+        )
+        for entry in entries:
+            self._containing[entry.id].add(owner_id)
+        self._dirty.discard(owner_id)
+        while len(self._decks) > self.max_decks:
+            self.drop(next(iter(self._decks)))
+
+    def drop(self, owner_id: uuid.UUID):
+        deck = self._decks.pop(owner_id, None)
+        if deck is not None:
+            self._unindex(owner_id, deck)
+
+    def _unindex(self, owner_id: uuid.UUID, deck: _Deck):
+        for entry in deck.entries:
+            self._unlink(entry.id, owner_id)
+
+    def _unlink(self, candidate_id: uuid.UUID, owner_id: uuid.UUID):
+        owners = self._containing.get(candidate_id)
+        if owners is not None:
+            owners.discard(owner_id)
+            if not owners:
+                del self._containing[candidate_id]
+
+    def peek(self, owner_id: uuid.UUID, limit: int) -> Optional[List[UserProfileResponse]]:
+        """First `limit` candidates, or None if the owner has no deck yet
+
+        Dirty or expired decks are still served (and left to the background
+        rebuild), so the spatial query stays off the request path.
+        """
+        deck = self._decks.get(owner_id)
+        if deck is None:
+            return None
+        now = time.monotonic()
+        deck.read_at = now
+        self._decks.move_to_end(owner_id)
+        if now - deck.built_at > self.ttl:
+            self._dirty.add(owner_id)
+
+        # Discarded entries at the front are popped for good (O(1) each)
+        while deck.entries and deck.entries[0].id in deck.removed:
+            candidate_id = deck.entries.popleft().id
+            deck.removed.discard(candidate_id)
+            self._unlink(candidate_id, owner_id)
+
+        result = []
+        for entry in deck.entries:
+            if len(result) >= limit:
+                break
+            if entry.id not in deck.removed:
+                result.append(entry)
+
+        if len(result) < limit and deck.full:
+            # A truncated deck ran low: there may be more candidates in the database
+            self._dirty.add(owner_id)
+        return result
+
+    def discard(self, owner_id: uuid.UUID, candidate_ids: Iterable[uuid.UUID]):
+        """Remove liked/skipped candidates from the owner's deck"""
+        deck = self._decks.get(owner_id)
+        if deck is not None:
+            candidate_ids = set(candidate_ids)
+            deck.removed.update(candidate_ids)
+            # Changes of discarded candidates no longer concern this deck
+            for candidate_id in candidate_ids:
+                self._unlink(candidate_id, owner_id)
+
+    def users_changed(self, user_ids: Iterable[uuid.UUID]):
+        """Record users whose location, radius, budget or activity changed"""
+        user_ids = set(user_ids)
+        self._changed |= user_ids
+        self._dirty |= user_ids
+
+    def take_changed(self) -> Set[uuid.UUID]:
+        changed, self._changed = self._changed, set()
+        return changed
+
+    def owners_containing(self, candidate_id: uuid.UUID) -> Set[uuid.UUID]:
+        return set(self._containing.get(candidate_id, ()))
+
+    def owners_near(self, lat: float, lon: float, radius: int) -> List[uuid.UUID]:
+        """Deck owners whose search circle intersects the given one"""
+        if not self._decks:
+            return []
+        owners = list(self._decks)
+        decks = [self._decks[owner] for owner in owners]
+        indices, _ = intersecting_search_areas(
+            lat, lon, radius,
+            as_coordinate_array([deck.lat for deck in decks]),
+            as_coordinate_array([deck.lon for deck in decks]),
+            as_coordinate_array([deck.radius for deck in decks])
+        )
+        return [owners[index] for index in indices]
+
+    def mark_dirty(self, owner_ids: Iterable[uuid.UUID]):
+        self._dirty.update(owner_ids)
+
+    def evict_idle(self) -> int:
+        """Drop decks whose owner has not read them within the TTL"""
+        now = time.monotonic()
+        idle = []
+        for owner, deck in self._decks.items():
+            if now - deck.read_at <= self.ttl:
+                break
+            idle.append(owner)
+        for owner in idle:
+            self.drop(owner)
+        return len(idle)
+
+    def take_dirty(self, limit: int) -> List[uuid.UUID]:
+        """Up to `limit` recently read decks to rebuild: dirty ones first, then aging ones
+
+        Idle decks are evicted rather than rebuilt.
+        """
+        self.evict_idle()
+        now = time.monotonic()
+        self._dirty &= set(self._decks)
+        owners = list(self._dirty)[:limit]
+        if len(owners) < limit:
+            owners += [
+                owner for owner, deck in self._decks.items()
+                if owner not in self._dirty and now - deck.built_at > self.ttl * SWIPE_DECK_REBUILD_AGE
+            ][:limit - len(owners)]
+        self._dirty.difference_update(owners)
+        return owners
+
+
+# Process-wide decks used by MatchingService
+swipe_decks = SwipeDeckStore()
@@ -0,0 +1,81 @@
+"""
+Tests for the in-process TTL/LRU caches
+"""
+import pytest
+
+import cache
+from cache import TTLCache, cache_stats
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache.time, "monotonic", fake)
+    return fake
+
+
+def test_get_returns_stored_value_until_ttl(clock):
+    c = TTLCache("test_ttl", maxsize=10, ttl=5)
+    c.set("a", 1)
+    clock.now += 4.9
+    assert c.get("a") == 1
+    clock.now += 0.2
+    assert c.get("a") is None
+    assert len(c) == 0
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    c = TTLCache("test_entry_ttl", maxsize=10, ttl=60)
+    c.set("short", 1, ttl=1)
+    c.set("long", 2)
+    clock.now += 2
+    assert c.get("short", "missing") == "missing"
+    assert c.get("long") == 2
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    c = TTLCache("test_lru", maxsize=2, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    assert c.get("a") == 1  # "b" is now the least recently used
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    assert c.get("c") == 3
+    assert c.evictions == 1
+
+
+def test_pop_and_clear_count_invalidations(clock):
+    c = TTLCache("test_invalidate", maxsize=10, ttl=60)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.set("c", 3)
+    c.pop("a")
+    c.pop("missing")
+    assert c.invalidations == 1
+    c.clear()
+    assert c.invalidations == 3
+    assert len(c) == 0
+
+
+def test_stats(clock):
+    c = TTLCache("test_stats", maxsize=4, ttl=30)
+    assert c.stats()["hit_rate"] is None
+    c.set("a", 1)
+    c.get("a")
+    c.get("b")
+    c.get("a")
+    stats = c.stats()
+    assert stats["size"] == 1
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == round(2 / 3, 4)
+    assert cache_stats()["test_stats"] == stats
@@ -0,0 +1,59 @@
+"""
+Тесты поиска пересекающихся зон поиска: сравнение с полным перебором пар
+"""
+import numpy as np
+import pytest
+
+import intersection_analysis
+from geo_distance import haversine_between
+from intersection_analysis import intersecting_pairs, synthetic_users
+
+
+def brute_force_pairs(lats, lons, radii):
+    i, j = np.triu_indices(len(lats), k=1)
+    distances = haversine_between(lats[i], lons[i], lats[j], lons[j])
+    keep = distances <= radii[i] + radii[j]
+    return {(int(a), int(b)): float(d) for a, b, d in zip(i[keep], j[keep], distances[keep])}
+
+
+def collect(batches):
+    found = {}
+    for i, j, distances in batches:
+        assert np.all(i < j)
+        for a, b, d in zip(i, j, distances):
+            assert (int(a), int(b)) not in found
+            found[int(a), int(b)] = float(d)
+    return found
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_pairs_match_brute_force(workers):
+    _, lats, lons, radii = synthetic_users(600, seed=7)
+    expected = brute_force_pairs(lats, lons, radii)
+    found = collect(intersecting_pairs(lats, lons, radii, workers=workers, chunksize=4))
+    assert found.keys() == expected.keys()
+    for pair, distance in expected.items():
+        assert found[pair] == pytest.approx(distance)
+
+
+def test_small_blocks_match_brute_force(monkeypatch):
+    # Ячейки режутся на много блоков строк
+    monkeypatch.setattr(intersection_analysis, "MAX_BLOCK_ELEMENTS", 50)
+    _, lats, lons, radii = synthetic_users(300, seed=11)
+    found = collect(intersecting_pairs(lats, lons, radii, workers=1))
+    assert found.keys() == brute_force_pairs(lats, lons, radii).keys()
+
+
+def test_users_without_coordinates_are_skipped():
+    lats = [55.75, None, 55.751, 55.9]
+    lons = [37.61, 37.61, 37.611, 37.9]
+    radii = [500, 500, None, 500]
+    assert collect(intersecting_pairs(lats, lons, radii, workers=1)) == {}
+
+    radii = [500, 500, 500, 500]
+    assert set(collect(intersecting_pairs(lats, lons, radii, workers=1))) == {(0, 2)}
+
+
+def test_fewer_than_two_users():
+    assert list(intersecting_pairs([55.75], [37.61], [1000], workers=1)) == []
+    assert list(intersecting_pairs([], [], [], workers=1)) == []
@@ -0,0 +1,135 @@
+"""
+Tests for the in-process listing spatial index: queries are checked against a
+brute-force haversine scan of the same listings
+"""
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic")
+
+from geo_distance import haversine_distances
+from listing_index import ListingSpatialIndex
+from schemas import ListingResponse
+
+
+def make_listing(lat, lon, price=50000, is_active=True, listing_id=None):
+    return ListingResponse(
+        id=listing_id or uuid.uuid4(),
+        title="Test listing",
+        price=price,
+        lat=lat,
+        lon=lon,
+        is_active=is_active,
+        created_at=datetime(2024, 1, 1),
+    )
+
+
+def random_listings(count, seed=3):
+    rng = np.random.default_rng(seed)
+    listings = [
+        make_listing(float(lat), float(lon), int(price), is_active=bool(active))
+        for lat, lon, price, active in zip(
+            rng.uniform(55.6, 55.9, count),
+            rng.uniform(37.4, 37.8, count),
+            rng.integers(20000, 150000, count),
+            rng.random(count) > 0.1,
+        )
+    ]
+    # Several listings in one building: equal distances exercise the id tie-break
+    listings += [make_listing(55.75, 37.62, 60000) for _ in range(5)]
+    return listings
+
+
+def brute_force(listings, lat, lon, radius, price_min=None, price_max=None):
+    active = [
+        listing for listing in listings
+        if listing.is_active
+        and (price_min is None or listing.price >= price_min)
+        and (price_max is None or listing.price <= price_max)
+    ]
+    distances = haversine_distances(
+        lat, lon,
+        np.array([listing.lat for listing in active]),
+        np.array([listing.lon for listing in active])
+    )
+    return sorted(
+        ((float(distance) / 1000, listing.id) for distance, listing in zip(distances, active) if distance <= radius)
+    )
+
+
+@pytest.fixture
+def listings():
+    return random_listings(2000)
+
+
+@pytest.fixture
+def index(listings):
+    index = ListingSpatialIndex(cell_size=1000)
+    index.build(listings)
+    return index
+
+
+@pytest.mark.parametrize("lat, lon, radius, price_min, price_max", [
+    (55.75, 37.62, 1500, None, None),
+    (55.75, 37.62, 5000, 40000, 90000),
+    (55.7, 37.5, 800, None, 70000),
+    (55.85, 37.75, 12000, 100000, None),
+    (56.5, 38.5, 1000, None, None),
+])
+def test_query_matches_brute_force(index, listings, lat, lon, radius, price_min, price_max):
+    expected = brute_force(listings, lat, lon, radius, price_min, price_max)[:50]
+    result = index.query(lat, lon, radius, price_min, price_max, limit=50)
+    assert [listing.id for listing in result] == [listing_id for _, listing_id in expected]
+    for listing, (distance, _) in zip(result, expected):
+        assert listing.distance == pytest.approx(distance)
+
+
+def test_cursor_pages_cover_every_listing_once(index, listings):
+    expected = brute_force(listings, 55.75, 37.62, 3000)
+    pages = []
+    after = None
+    while True:
+        page = index.query(55.75, 37.62, 3000, limit=7, after=after)
+        if not page:
+            break
+        pages += page
+        after = (page[-1].distance, page[-1].id)
+    assert [listing.id for listing in pages] == [listing_id for _, listing_id in expected]
+
+
+def test_upsert_moves_and_removes_listings():
+    index = ListingSpatialIndex(cell_size=500)
+    listing = make_listing(55.75, 37.62)
+    index.build([listing])
+    assert [item.id for item in index.query(55.75, 37.62, 100)] == [listing.id]
+
+    moved = listing.model_copy(update={"lat": 55.80, "lon": 37.70})
+    index.upsert(moved)
+    assert len(index) == 1
+    assert index.query(55.75, 37.62, 100) == []
+    assert [item.id for item in index.query(55.80, 37.70, 100)] == [listing.id]
+
+    index.upsert(moved.model_copy(update={"is_active": False}))
+    assert len(index) == 0
+    assert index.query(55.80, 37.70, 100) == []
+
+    index.upsert(moved)
+    index.remove(moved.id)
+    index.remove(moved.id)
+    assert len(index) == 0
+
+
+def test_freshness():
+    index = ListingSpatialIndex(max_age=30)
+    assert not index.is_fresh
+    index.build([])
+    assert index.is_fresh
+    index.mark_stale()
+    assert not index.is_fresh
+    index.touch(datetime(2024, 1, 2))
+    index.touch(datetime(2024, 1, 1))
+    assert index.is_fresh
+    assert index.synced_through == datetime(2024, 1, 2)
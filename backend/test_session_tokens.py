@@ -0,0 +1,114 @@
+"""
+Тесты сессионных токенов (/api/auth/session) и зависимости get_secure_identity
+"""
+import asyncio
+import json
+import uuid
+
+import pytest
+
+for _module in ("fastapi", "sqlalchemy", "geoalchemy2", "asyncpg", "pydantic"):
+    pytest.importorskip(_module)
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import auth_new
+from auth_new import (
+    SESSION_TOKEN_PREFIX,
+    decode_session_token,
+    get_secure_identity,
+    get_session_identity,
+    issue_session_token,
+)
+from services import UserIdentity, user_identity_cache
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+def split(token: str):
+    payload, signature = token[len(SESSION_TOKEN_PREFIX):].split(".")
+    return payload, signature
+
+
+@pytest.fixture(autouse=True)
+def empty_identity_cache():
+    user_identity_cache.clear()
+    yield
+    user_identity_cache.clear()
+
+
+def test_round_trip():
+    user_id = uuid.uuid4()
+    token, identity = issue_session_token(user_id, 123456789)
+    assert token.startswith(SESSION_TOKEN_PREFIX)
+    assert decode_session_token(token) == identity
+    assert identity.user_id == user_id
+    assert identity.telegram_id == 123456789
+
+
+def test_tampered_payload_is_rejected():
+    token, _ = issue_session_token(uuid.uuid4(), 1)
+    _, signature = split(token)
+    forged = auth_new._b64encode(json.dumps(
+        {"sub": str(uuid.uuid4()), "tid": 2, "exp": 2 ** 40}, separators=(",", ":")
+    ).encode())
+    with pytest.raises(ValueError, match="signature"):
+        decode_session_token(f"{SESSION_TOKEN_PREFIX}{forged}.{signature}")
+
+
+def test_tampered_signature_is_rejected():
+    token, _ = issue_session_token(uuid.uuid4(), 1)
+    payload, signature = split(token)
+    tampered = ("B" if signature[0] == "A" else "A") + signature[1:]
+    with pytest.raises(ValueError, match="signature"):
+        decode_session_token(f"{SESSION_TOKEN_PREFIX}{payload}.{tampered}")
+
+
+def test_expired_token_is_rejected():
+    token, _ = issue_session_token(uuid.uuid4(), 1, ttl=-5)
+    with pytest.raises(ValueError, match="expired"):
+        decode_session_token(token)
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "v1.",
+    "v1.onlypayload",
+    "v1.a.b.c",
+    "v1.payload.!!!",
+    "query_id=AAA&user=%7B%7D&hash=abc",
+])
+def test_malformed_token_is_rejected(token):
+    with pytest.raises(ValueError):
+        decode_session_token(token)
+
+
+def test_malformed_token_gives_401():
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(get_session_identity(bearer("v1.garbage")))
+    assert excinfo.value.status_code == 401
+
+
+def test_secure_identity_from_session_token_without_database():
+    user_id = uuid.uuid4()
+    token, _ = issue_session_token(user_id, 42)
+    identity = asyncio.run(get_secure_identity(bearer(token), db=None))
+    assert identity == UserIdentity(user_id, 42, True)
+
+
+def test_secure_identity_prefers_cached_identity():
+    user_id = uuid.uuid4()
+    token, _ = issue_session_token(user_id, 42)
+    user_identity_cache.set(42, UserIdentity(user_id, 42, False))
+    identity = asyncio.run(get_secure_identity(bearer(token), db=None))
+    assert identity.is_active is False
+
+
+@pytest.mark.parametrize("credentials", ["v1.garbage.signature", "query_id=AAA&user=%7B%7D&hash=abc"])
+def test_secure_identity_rejects_malformed_credentials(credentials):
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(get_secure_identity(bearer(credentials), db=None))
+    assert excinfo.value.status_code == 401
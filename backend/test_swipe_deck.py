@@ -0,0 +1,141 @@
+"""
+Tests for the per-user swipe deck store
+"""
+import uuid
+
+import numpy as np
+import pytest
+
+pytest.importorskip("pydantic")
+
+import swipe_deck
+from geo_distance import haversine_distances
+from schemas import UserProfileResponse
+from swipe_deck import SwipeDeckStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(swipe_deck.time, "monotonic", fake)
+    return fake
+
+
+def candidates(count):
+    return [UserProfileResponse(id=uuid.uuid4()) for _ in range(count)]
+
+
+def ids(entries):
+    return [entry.id for entry in entries]
+
+
+def test_peek_without_deck():
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=10)
+    assert store.peek(uuid.uuid4(), 5) is None
+
+
+def test_discard_hides_and_unlinks_candidates(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=10)
+    owner = uuid.uuid4()
+    entries = candidates(5)
+    store.store(owner, entries, 55.75, 37.62, 1000)
+    assert ids(store.peek(owner, 3)) == ids(entries[:3])
+
+    store.discard(owner, [entries[0].id, entries[2].id])
+    assert ids(store.peek(owner, 3)) == [entries[1].id, entries[3].id, entries[4].id]
+    assert store.owners_containing(entries[0].id) == set()
+    assert store.owners_containing(entries[2].id) == set()
+    assert store.owners_containing(entries[1].id) == {owner}
+
+    # Replacing the deck re-indexes only the new entries
+    store.store(owner, entries[3:], 55.75, 37.62, 1000)
+    assert store.owners_containing(entries[1].id) == set()
+    store.drop(owner)
+    assert all(store.owners_containing(entry.id) == set() for entry in entries)
+
+
+def test_least_recently_read_deck_is_evicted(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=2)
+    first, second, third = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    shared = candidates(1)
+    store.store(first, shared, 55.75, 37.62, 1000)
+    store.store(second, shared, 55.75, 37.62, 1000)
+    store.peek(first, 1)
+    # A rebuild is not a read and keeps the LRU position
+    store.store(second, shared, 55.75, 37.62, 1000)
+    store.store(third, shared, 55.75, 37.62, 1000)
+    assert len(store) == 2
+    assert store.peek(second, 1) is None
+    assert store.owners_containing(shared[0].id) == {first, third}
+
+
+def test_expired_deck_is_served_and_rebuilt(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=10)
+    owner = uuid.uuid4()
+    entries = candidates(3)
+    store.store(owner, entries, 55.75, 37.62, 1000)
+    clock.now += 61
+    assert ids(store.peek(owner, 3)) == ids(entries)
+    assert store.take_dirty(10) == [owner]
+    # The background worker rebuilds it
+    store.store(owner, entries[1:], 55.75, 37.62, 1000)
+    assert store.take_dirty(10) == []
+    assert ids(store.peek(owner, 3)) == ids(entries[1:])
+
+
+def test_idle_decks_are_evicted_instead_of_rebuilt(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=10)
+    idle, active = uuid.uuid4(), uuid.uuid4()
+    store.store(idle, candidates(2), 55.75, 37.62, 1000)
+    store.store(active, candidates(2), 55.75, 37.62, 1000)
+    store.mark_dirty([idle, active])
+    clock.now += 50
+    store.peek(active, 1)
+    clock.now += 20
+    assert store.take_dirty(10) == [active]
+    assert store.peek(idle, 1) is None
+
+
+def test_full_deck_running_low_is_marked_dirty(clock):
+    store = SwipeDeckStore(size=3, ttl=60, max_decks=10)
+    owner = uuid.uuid4()
+    entries = candidates(3)
+    store.store(owner, entries, 55.75, 37.62, 1000)
+    store.peek(owner, 3)
+    assert store.take_dirty(10) == []
+    store.discard(owner, [entries[0].id])
+    assert ids(store.peek(owner, 3)) == ids(entries[1:])
+    assert store.take_dirty(10) == [owner]
+
+
+def test_users_changed(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=10)
+    owner = uuid.uuid4()
+    store.store(owner, candidates(1), 55.75, 37.62, 1000)
+    store.users_changed([owner, uuid.uuid4()])
+    assert len(store.take_changed()) == 2
+    assert store.take_changed() == set()
+    assert store.take_dirty(10) == [owner]
+
+
+def test_owners_near_matches_brute_force(clock):
+    store = SwipeDeckStore(size=10, ttl=60, max_decks=1000)
+    rng = np.random.default_rng(5)
+    owners = [uuid.uuid4() for _ in range(300)]
+    lats = rng.uniform(55.6, 55.9, len(owners))
+    lons = rng.uniform(37.4, 37.8, len(owners))
+    radii = rng.integers(500, 3000, len(owners))
+    for owner, lat, lon, radius in zip(owners, lats, lons, radii):
+        store.store(owner, [], float(lat), float(lon), int(radius))
+
+    distances = haversine_distances(55.75, 37.62, lats, lons)
+    expected = {owner for owner, distance, radius in zip(owners, distances, radii) if distance <= radius + 2000}
+    assert set(store.owners_near(55.75, 37.62, 2000)) == expected
@@ -14,9 +14,11 @@ CREATE TABLE users (
     bio TEXT,
     price_min INTEGER CHECK (price_min >= 0),
     price_max INTEGER CHECK (price_max >= price_min),
+    price_range INT4RANGE GENERATED ALWAYS AS (int4range(price_min, price_max, '[]')) STORED,
     metro_station VARCHAR(255),
     search_location GEOGRAPHY(POINT, 4326),
     search_radius INTEGER CHECK (search_radius > 0), -- in meters
+    search_area GEOGRAPHY(POLYGON, 4326), -- ST_Buffer(search_location, search_radius), see trigger_user_search_area
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -74,11 +76,22 @@ CREATE TABLE listing_likes (
 -- Create indexes for performance
 CREATE INDEX idx_users_telegram_id ON users(telegram_id);
 CREATE INDEX idx_users_location ON users USING GIST(search_location);
+-- MAX(search_radius) bounds the potential-matches prefilter
+CREATE INDEX idx_users_search_radius ON users(search_radius);
+-- Spatial + budget-overlap (&&) prefilter of potential matches
+CREATE INDEX idx_users_location_price_range ON users USING GIST(search_location, price_range);
+-- Reverse geo-matching: users whose search circle contains a listing
+CREATE INDEX idx_users_search_area ON users USING GIST(search_area);
 CREATE INDEX idx_listings_location ON listings USING GIST(location);
+CREATE INDEX idx_listings_location_geometry ON listings USING GIST((location::geometry));
 CREATE INDEX idx_listings_price ON listings(price);
 CREATE INDEX idx_listings_active ON listings(is_active);
+CREATE INDEX idx_listings_created_id ON listings(created_at, id);
+CREATE INDEX idx_listings_updated_at ON listings(updated_at);
 CREATE INDEX idx_user_likes_liker ON user_likes(liker_id);
 CREATE INDEX idx_user_likes_liked ON user_likes(liked_id);
+CREATE INDEX idx_user_matches_user1 ON user_matches(user1_id, created_at);
+CREATE INDEX idx_user_matches_user2 ON user_matches(user2_id, created_at);
 CREATE INDEX idx_listing_likes_user ON listing_likes(user_id);
 CREATE INDEX idx_listing_likes_listing ON listing_likes(listing_id);
 
@@ -104,8 +117,93 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Like users and create matches on mutual likes, in one statement
+CREATE OR REPLACE FUNCTION like_users_and_match(p_liker UUID, p_liked UUID[])
+RETURNS TABLE (target_id UUID, liked BOOLEAN, matched BOOLEAN) AS $$
+DECLARE
+    v_new UUID[];
+    v_mutual UUID[];
+BEGIN
+    -- Serialize likes within each pair (in key order, so batches can't
+    -- deadlock): the second of two concurrent mutual likes waits here and
+    -- its statements below see the first one's like
+    PERFORM pg_advisory_xact_lock(k.key)
+    FROM (
+        SELECT DISTINCT hashtextextended(LEAST(p_liker, t.id)::text || GREATEST(p_liker, t.id)::text, 0) AS key
+        FROM unnest(p_liked) AS t(id)
+        ORDER BY 1
+    ) k;
+
+    -- One multi-row insert; existing likes are skipped by UNIQUE(liker_id, liked_id).
+    -- Unknown or deleted users are skipped too (KEY SHARE keeps them until commit)
+    -- instead of failing the whole batch on the foreign key
+    WITH inserted AS (
+        INSERT INTO user_likes (id, liker_id, liked_id)
+        SELECT gen_random_uuid(), p_liker, t.id
+        FROM (SELECT DISTINCT unnest(p_liked) AS id) t
+        JOIN users u ON u.id = t.id
+        WHERE t.id <> p_liker
+        FOR KEY SHARE OF u
+        ON CONFLICT (liker_id, liked_id) DO NOTHING
+        RETURNING user_likes.liked_id
+    )
+    SELECT COALESCE(array_agg(inserted.liked_id), '{}') INTO v_new FROM inserted;
+
+    SELECT COALESCE(array_agg(ul.liker_id), '{}') INTO v_mutual
+    FROM user_likes ul
+    WHERE ul.liked_id = p_liker AND ul.liker_id = ANY(v_new);
+
+    -- May already exist if trigger_create_match is installed
+    INSERT INTO user_matches (id, user1_id, user2_id)
+    SELECT gen_random_uuid(), LEAST(p_liker, m.id), GREATEST(p_liker, m.id)
+    FROM unnest(v_mutual) AS m(id)
+    ON CONFLICT (user1_id, user2_id) DO NOTHING;
+
+    -- Unknown users get no row
+    RETURN QUERY
+    SELECT t.id, t.id = ANY(v_new), t.id = ANY(v_mutual)
+    FROM (SELECT DISTINCT unnest(p_liked) AS id) t
+    WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = t.id);
+END;
+$$ LANGUAGE plpgsql;
+
 -- Trigger to create matches automatically
 CREATE TRIGGER trigger_create_match
     AFTER INSERT ON user_likes
     FOR EACH ROW
-    EXECUTE FUNCTION create_match_on_mutual_like();
\ No newline at end of file
+    EXECUTE FUNCTION create_match_on_mutual_like();
+
+-- Keep users.search_area in sync with search_location/search_radius
+CREATE OR REPLACE FUNCTION update_user_search_area()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.search_location IS NULL OR NEW.search_radius IS NULL THEN
+        NEW.search_area := NULL;
+    ELSE
+        NEW.search_area := ST_Buffer(NEW.search_location, NEW.search_radius);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_user_search_area
+    BEFORE INSERT OR UPDATE OF search_location, search_radius ON users
+    FOR EACH ROW
+    EXECUTE FUNCTION update_user_search_area();
+
+-- Bump listings.updated_at on every update that doesn't set it itself
+-- (the listing index refresh picks up changes by updated_at)
+CREATE OR REPLACE FUNCTION touch_listing_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+        NEW.updated_at := CURRENT_TIMESTAMP;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_listing_updated_at
+    BEFORE UPDATE ON listings
+    FOR EACH ROW
+    EXECUTE FUNCTION touch_listing_updated_at();